@@ -0,0 +1,194 @@
+'''
+Description: nc文件生成的端到端基准测试, 使用合成的微雨雷达数据, 分阶段统计耗时及内存峰值, 结果以json输出
+
+    python benchmarks/bench_generate.py --records 8640 --repeat 3 --output bench.json
+
+    --stream 时另外以gerneral_nc_stream按--batch-size分批写入, 记录含关闭文件(分块写出及压缩)在内的总耗时
+'''
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from copy import deepcopy
+
+import netCDF4 as nc
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generate import NcGenerator                                                    # noqa: E402
+from generate.config import NcStorage, NcType                                       # noqa: E402
+from generate.config.microrain_radar_cfg import MicroRianRadarRawNCINFO, Datetime   # noqa: E402
+from generate import plan as plan_module                                            # noqa: E402
+from generate.prefetch import Prefetcher                                            # noqa: E402
+
+
+# 压缩设置名称 -> Spectral_reflectivities等数值观测要素使用的存储选项
+COMPRESSIONS = {
+    'none': NcStorage(compression=None),
+    'zlib1': NcStorage(compression='zlib', complevel=1),
+    'zlib4': NcStorage(compression='zlib', complevel=4),
+    'zstd3': NcStorage(compression='zstd', complevel=3),
+    'zlib4_q3': NcStorage(compression='zlib', complevel=4, significant_digits=3),
+}
+
+
+class MemoryCollection:
+    """内存中的数据库替代, 提供与MyMongodb.get_docs相同的调用方式"""
+    def __init__(self, docs) -> None:
+        self.docs = docs
+
+    def get_docs(self, coll_name, sortby=None, sql=None, limit=None, fields=None, exclude_id=False, batch_size=None):
+        fields = None if fields is None else set(fields)
+        for d in self.docs[:limit] if limit else self.docs:
+            yield d if fields is None else {k: v for k, v in d.items() if k in fields}
+
+
+def build_config(n_hgt: int, n_bins: int, storage: NcStorage) -> dict:
+    """按指定维度大小及存储选项构造与MicroRianRadarRawNCINFO结构相同的配置"""
+    hgt = ('Dime_HGT', n_hgt)
+    bins = ('Dime_part_diam_clas', n_bins)
+    config = deepcopy(MicroRianRadarRawNCINFO)
+    config['observation'] = [
+        ('Datetime', NcType.string, (Datetime, ), 'Datetime', 'yyyy-mm-dd hh:mm:ss'),
+        ('HGT', NcType.ushort, (Datetime, hgt), 'Height in meters', 'm', storage),
+        ('Transfer_function', NcType.double, (Datetime, hgt), 'Transfer function', '-', storage),
+        ('Spectral_reflectivities', NcType.double, (Datetime, hgt, bins), 'Spectral reflectivities', 'dB', storage),
+        ('Q_data', NcType.ubyte, (Datetime, ), 'Quality control code of data', '-', storage),
+    ]
+    return config
+
+
+def synthetic_records(n_records: int, n_hgt: int, n_bins: int, seed: int=0) -> list:
+    """生成与数据库中文档形式相同(嵌套列表)的合成数据"""
+    rng = np.random.default_rng(seed)
+    start = np.datetime64('2024-01-01T00:00:00')
+    records = []
+    for i in range(n_records):
+        records.append({
+            'station_name': 'Xiaohai', 'station_id': 'R7253', 'latitude': 26.94, 'longitude': 104.18,
+            'altitude': 2216, 'station_type': 40, 'station_level': '015',
+            'Device_version': 'DVS: 6.00', 'Devi_seri_numb': 'DSN: 0505123820', 'BW': 'BW: 40200',
+            'Calibration_constant': 'CC: 2279042', 'MMR_data_qual': 'MDQ: 100', 'Data_level': 'Lraw',
+            'Datetime': str(start + np.timedelta64(10 * i, 's')).replace('T', ' '),
+            'HGT': list(range(0, 35 * n_hgt, 35)),
+            'Transfer_function': rng.random(n_hgt).tolist(),
+            'Spectral_reflectivities': (rng.normal(20, 5, (n_hgt, n_bins))).round(2).tolist(),
+            'Q_data': 0,
+        })
+    return records
+
+
+@contextmanager
+def _stage(results: dict, name: str, trace: bool):
+    if trace:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        yield
+        results[name] = tracemalloc.get_traced_memory()[1] - base
+    else:
+        st = time.perf_counter()
+        yield
+        results[name] = time.perf_counter() - st
+
+
+def run_once(config: dict, db, n_records: int, nc_path: str, trace: bool=False) -> dict:
+    """执行一次完整的生成流程, 返回各阶段的耗时(秒)或内存峰值增量(字节)"""
+    res = {}
+    with _stage(res, 'config_parse', trace):
+        plan_module._PLAN_CACHE.clear()
+        generator = NcGenerator(config)
+    with _stage(res, 'fetch', trace):
+        records = list(Prefetcher(db.get_docs('RRD_Lraw', fields=generator.source_keys, exclude_id=True)))
+    with _stage(res, 'head_update', trace):
+        head_values = generator._head_values(records[0], records[0]['Datetime'])
+    with _stage(res, 'column_assembly', trace):
+        columns = generator._assemble_columns(records)
+    with _stage(res, 'variable_write', trace):
+        nc_obj = nc.Dataset(nc_path, "w", "NETCDF4")
+        generator._generate_dimension(nc_obj)
+        nc_vars = generator._define_vars(nc_obj)
+        generator._write_head(nc_vars, head_values)
+        generator._write_columns(nc_vars, columns)
+    with _stage(res, 'close', trace):
+        nc_obj.close()
+    assert len(records) == n_records
+    return res
+
+
+def run_stream(config: dict, records: list, nc_path: str, batch_size: int) -> float:
+    """以gerneral_nc_stream分批生成nc文件, 返回总耗时(秒), 含关闭文件时的分块写出及压缩"""
+    generator = NcGenerator(config)
+    st = time.perf_counter()
+    count = generator.gerneral_nc_stream(nc_path, records, batch_size=batch_size)
+    seconds = time.perf_counter() - st
+    assert count == len(records)
+    return seconds
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="nc文件生成基准测试")
+    parser.add_argument('--records', type=int, default=8640, help="数据条数, 默认为10s分辨率一天的数据量")
+    parser.add_argument('--hgt', type=int, default=32, help="高度层数")
+    parser.add_argument('--bins', type=int, default=64, help="粒径档数")
+    parser.add_argument('--repeat', type=int, default=3, help="每种设置的重复次数, 耗时取最小值")
+    parser.add_argument('--compression', nargs='+', default=list(COMPRESSIONS.keys()), choices=list(COMPRESSIONS.keys()))
+    parser.add_argument('--stream', action='store_true', help="同时记录以gerneral_nc_stream分批写入的总耗时")
+    parser.add_argument('--batch-size', type=int, default=1000, help="分批写入时每批的数据条数")
+    parser.add_argument('--output', default='', help="结果json文件, 默认输出到stdout")
+    args = parser.parse_args(argv)
+
+    db = MemoryCollection(synthetic_records(args.records, args.hgt, args.bins))
+    report = {
+        'commit': _git_commit(),
+        'python': sys.version.split()[0],
+        'netcdf4': nc.__version__,
+        'netcdf_c': nc.__netcdf4libversion__,
+        'cpus': os.cpu_count(),
+        'records': args.records, 'hgt': args.hgt, 'bins': args.bins, 'repeat': args.repeat,
+        'results': {},
+    }
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name in args.compression:
+            config = build_config(args.hgt, args.bins, COMPRESSIONS[name])
+            nc_path = os.path.join(tmp_dir, f"{name}.nc")
+            runs = [run_once(config, db, args.records, nc_path) for _ in range(args.repeat)]
+            seconds = {stage: min(r[stage] for r in runs) for stage in runs[0]}
+            tracemalloc.start()
+            try:
+                peak_bytes = run_once(config, db, args.records, nc_path, trace=True)
+            finally:
+                tracemalloc.stop()
+            report['results'][name] = {
+                'seconds': seconds,
+                'total_seconds': sum(seconds.values()),
+                'peak_bytes': peak_bytes,
+                'file_bytes': os.path.getsize(nc_path),
+            }
+            if args.stream:
+                records = list(db.get_docs('RRD_Lraw'))
+                report['results'][name]['stream_seconds'] = min(run_stream(config, records, nc_path, args.batch_size)
+                                                                for _ in range(args.repeat))
+    text = json.dumps(report, indent=4)
+    if args.output:
+        with open(args.output, 'w') as fp:
+            fp.write(text)
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
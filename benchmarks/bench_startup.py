@@ -0,0 +1,77 @@
+'''
+Description: 启动(导入)耗时基准测试, 每个模块在新的python进程中导入多次取最小值, 超出预算时返回非零退出码,
+    同时检查导入时没有在仓库中创建文件(如日志文件), 结果以json输出
+
+    python benchmarks/bench_startup.py --repeat 5 --output startup.json
+'''
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 模块 -> 导入耗时预算(毫秒), 不含python解释器本身的启动时间
+BUDGETS_MS = {
+    'log': 50,
+    'generate': 50,
+    'parse': 100,
+    'dbcontroller': 400,                # pymongo本身的导入约需100~150ms
+    'generate.export': 400,             # 含netCDF4/numpy
+}
+
+_SNIPPET = "import time; st = time.perf_counter(); import {module}; print(time.perf_counter() - st)"
+
+
+def import_seconds(module: str, repeat: int=5) -> float:
+    """在新进程中导入模块repeat次, 返回最短的导入耗时(秒)"""
+    times = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', _SNIPPET.format(module=module)], cwd=ROOT,
+                             capture_output=True, text=True, check=True)
+        times.append(float(out.stdout.split()[-1]))
+    return min(times)
+
+
+def _repo_files() -> set:
+    files = set()
+    for root, dirs, names in os.walk(ROOT):
+        dirs[:] = [d for d in dirs if d not in ('.git', '__pycache__')]
+        files.update(os.path.join(root, name) for name in names)
+    return files
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="模块导入耗时基准测试")
+    parser.add_argument('--modules', nargs='+', default=list(BUDGETS_MS.keys()))
+    parser.add_argument('--repeat', type=int, default=5, help="每个模块的导入次数, 耗时取最小值")
+    parser.add_argument('--scale', type=float, default=1., help="预算的缩放系数, 用于较慢的机器")
+    parser.add_argument('--output', default='', help="结果json文件, 默认输出到stdout")
+    args = parser.parse_args(argv)
+
+    before = _repo_files()
+    results = {}
+    for module in args.modules:
+        seconds = import_seconds(module, args.repeat)
+        budget = BUDGETS_MS.get(module, float('inf')) * args.scale
+        results[module] = {'ms': round(seconds * 1000, 1), 'budget_ms': budget, 'ok': seconds * 1000 <= budget}
+    created = sorted(os.path.relpath(p, ROOT) for p in _repo_files() - before)
+    report = {
+        'python': sys.version.split()[0],
+        'repeat': args.repeat,
+        'results': results,
+        'files_created_on_import': created,
+    }
+    text = json.dumps(report, indent=4)
+    if args.output:
+        with open(args.output, 'w') as fp:
+            fp.write(text)
+    else:
+        print(text)
+    return 0 if all(r['ok'] for r in results.values()) and not created else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
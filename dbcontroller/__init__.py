@@ -8,25 +8,78 @@
 # @Description: 连接MongoDB数据库，并且读取数据
 
 import os
-from typing import List, Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Dict, Iterable, List, Optional, Sequence, Tuple, Union
 import logging
 from logging import getLogger
 import pymongo
 import gridfs
-from pymongo import CursorType
+import bson
+from pymongo import CursorType, ReplaceOne
 from pymongo.errors import OperationFailure
 from bson.objectid import ObjectId
-from dotenv import load_dotenv
+
+from .pool import METRICS, release_client, shared_client
 
 
-load_dotenv()
 logger = getLogger(os.path.basename(__file__))
+_DOTENV_LOADED = False      # .env文件在第一次获取数据库对象时才读取, 导入时不操作文件
+
+UPSERT_KEYS = ('station_id', 'Datetime')    # 幂等写入时默认的唯一键(站点, 时间)
+STREAM_BLOCK = 1 << 20                      # GridFS流式上传/下载时每次读写的字节数
+CHUNK_BYTES = 8 << 20                       # 每批写入的文档字节数预算
+TIME_INDEX = (('station_id', pymongo.ASCENDING), ('Datetime', pymongo.ASCENDING))   # 按站点及时间范围查询的复合索引
+
+
+def split_chunks(docs: Sequence[dict], chunk_bytes: int=CHUNK_BYTES, sample: int=16) -> List[Sequence[dict]]:
+    """按字节数预算将文档切分为多批, 文档大小以前sample条文档的平均BSON大小估计
+
+    Args:
+        docs (Sequence[dict]): 文档列表
+        chunk_bytes (int, optional): 每批的字节数预算. Defaults to CHUNK_BYTES.
+        sample (int, optional): 用于估计文档大小的文档数. Defaults to 16.
+    """
+    if len(docs) == 0:
+        return []
+    head = docs[: sample]
+    avg_size = sum(len(bson.encode(d)) for d in head) / len(head)
+    chunk = max(1, int(chunk_bytes // avg_size))
+    return [docs[st: st+chunk] for st in range(0, len(docs), chunk)]
+
+
+def build_projection(fields: Iterable[str]=None, exclude_id: bool=False) -> Optional[dict]:
+    """根据需要的字段构建find()的投影, 不限制字段且保留_id时返回None(返回整个文档)
+
+    Args:
+        fields (Iterable[str], optional): 需要返回的字段. Defaults to None.
+        exclude_id (bool, optional): 是否不返回_id字段. Defaults to False.
+    """
+    projection = {}
+    if fields is not None:
+        projection.update({field: 1 for field in fields})
+    if exclude_id:
+        projection['_id'] = 0
+    return projection or None
+
+
+def plan_stages(plan: Union[dict, list]) -> List[str]:
+    """递归列出explain()查询计划中的所有阶段名(COLLSCAN/IXSCAN/FETCH/SORT等)"""
+    stages = []
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            stages.append(plan['stage'])
+        for value in plan.values():
+            stages.extend(plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(plan_stages(value))
+    return stages
 
 
 class MyMongodb:
-    def __init__(self, host: str, username: str, pwd: str, database: str, port=27017, maxPoolSize=2):
+    def __init__(self, host: str, username: str, pwd: str, database: str, port=27017, maxPoolSize=2, shared: bool=False):
         """
-        初始化设置
+        初始化设置, 客户端在第一次操作时才建立连接
 
         :param host:        MongoDB数据库服务器IP地址
         :param username:    用户名
@@ -34,12 +87,17 @@ class MyMongodb:
         :param database:    要操作的数据库名
         :param port:        MongoDB数据库服务器端口，默认为27017
         :param maxPoolSize: MongoDB数据库服务器并发设置, 默认为2
+        :param shared:      是否使用本进程共享的客户端(连接池), 默认新建客户端
         """
         self.link = rf"mongodb://{username}:{pwd}@{host}:{port}/" 
-        self.client = pymongo.MongoClient(self.link, maxPoolSize=maxPoolSize)
+        self.shared = shared
+        if shared:
+            self.client = shared_client(self.link, maxPoolSize=maxPoolSize)
+        else:
+            self.client = pymongo.MongoClient(self.link, maxPoolSize=maxPoolSize, connect=False, event_listeners=[METRICS])
+        self.max_pool_size = maxPoolSize
         self.db = self.client[database]
-        if self.client.list_database_names():
-            logger.info(f"connect to mongo {host}:{self.db.name} database.")
+        logger.debug(f"use mongo {host}:{self.db.name} database.")
         
     def change_db(self, db_name: str):
         """将操作切换到指定数据库
@@ -61,19 +119,71 @@ class MyMongodb:
         logger.debug(f"collections in {self.db.name}: {colls}")
         return colls
     
-    def get_docs(self, coll_name: str, sortby: Union[str, list]=None, sql: dict=None, limit: int=None) -> CursorType:
+    def get_docs(self, coll_name: str, sortby: Union[str, list]=None, sql: dict=None, limit: int=None,
+                 projection: dict=None, batch_size: int=None, fields: Iterable[str]=None, exclude_id: bool=False,
+                 hint: Union[str, list]=None) -> CursorType:
         """
         根据sql进行数据的处理
+
+        :param projection:  返回字段的投影, 默认返回整个文档, 不能与fields/exclude_id同时使用
+        :param batch_size:  游标每次从服务器获取的文档数, 默认由服务器决定
+        :param fields:      只返回这些字段, 默认返回整个文档
+        :param exclude_id:  是否不返回_id字段, 默认返回
+        :param hint:        强制使用的索引(索引名或键列表), 默认由服务器选择
         """
+        if projection is None:
+            projection = build_projection(fields, exclude_id)
+        elif fields is not None or exclude_id:
+            raise ValueError("projection can not be used together with fields or exclude_id.")
         if sql == None:
-            table_data = self.db[coll_name].find()                 # 查询集合（表）中所有数据
+            table_data = self.db[coll_name].find(projection=projection)        # 查询集合（表）中所有数据
         else:
-            table_data = self.db[coll_name].find(sql)        # 根据条件查询集合（表）中的数据
+            table_data = self.db[coll_name].find(sql, projection=projection)   # 根据条件查询集合（表）中的数据
         if sortby:
             table_data = table_data.sort(sortby)
         if limit:
             table_data = table_data.limit(limit)
+        if batch_size:
+            table_data = table_data.batch_size(batch_size)
+        if hint:
+            table_data = table_data.hint(hint)
         return table_data
+
+    def get_time_range(self, coll_name: str, start, end, station=None, station_field: str='station_id', time_field: str='Datetime',
+                       fields: Iterable[str]=None, exclude_id: bool=False, batch_size: int=None, hint: bool=True) -> CursorType:
+        """按站点及时间范围[start, end)查询并按时间排序, 指定站点时使用(站点, 时间)复合索引
+
+        Args:
+            coll_name (str): 集合名
+            start: 开始时间, 与集合中时间字段的类型一致
+            end: 结束时间(不含)
+            station (optional): 站点, 为None时查询所有站点. Defaults to None.
+            station_field (str, optional): 站点字段名. Defaults to 'station_id'.
+            time_field (str, optional): 时间字段名. Defaults to 'Datetime'.
+            fields (Iterable[str], optional): 只返回这些字段. Defaults to None.
+            exclude_id (bool, optional): 是否不返回_id字段. Defaults to False.
+            batch_size (int, optional): 游标每次从服务器获取的文档数. Defaults to None.
+            hint (bool, optional): 是否强制使用复合索引, 需先调用ensure_index建立. Defaults to True.
+        """
+        sql = {time_field: {"$gte": start, "$lt": end}}
+        index = None
+        if station is not None:
+            sql[station_field] = station
+            if hint:
+                index = [(station_field, pymongo.ASCENDING), (time_field, pymongo.ASCENDING)]
+        return self.get_docs(coll_name, sortby=time_field, sql=sql, fields=fields, exclude_id=exclude_id, batch_size=batch_size, hint=index)
+
+    def check_query(self, coll_name: str, sql: dict=None, sortby: Union[str, list]=None, hint: Union[str, list]=None) -> List[str]:
+        """使用explain()检查查询计划, 查询退化为全集合扫描(COLLSCAN)时记录警告
+
+        Returns:
+            List[str]: 查询计划中的阶段名
+        """
+        plan = self.get_docs(coll_name, sortby=sortby, sql=sql, hint=hint).explain()
+        stages = plan_stages(plan.get('queryPlanner', {}).get('winningPlan', {}))
+        if 'COLLSCAN' in stages:
+            logger.warning(f"query {sql} sorted by {sortby} on {self.db.name}.{coll_name} uses a collection scan, consider creating an index.")
+        return stages
     
     def get_field_distinct(self, coll_name: str, field: str):
         """获取集合中field字段的唯一值集合
@@ -84,24 +194,53 @@ class MyMongodb:
         data = self.db[coll_name].distinct(field)
         return data
         
-    def save_docs(self, data: Union[list, dict], coll_name: str, extend_dict: dict={}) -> int:
+    def save_docs(self, data: Union[list, dict], coll_name: str, extend_dict: dict={}, ordered: bool=False,
+                  chunk_bytes: int=CHUNK_BYTES, num_threads: int=None, upsert: bool=False,
+                  upsert_keys: Sequence[str]=UPSERT_KEYS) -> int:
         """
-        保存文档(行数据)到指定集合
+        保存文档(行数据)到指定集合, data也可以是列式数据批(generate.columnar.RecordBatch);
+        文档按字节数预算分批, 各批在连接池上并发写入, 不修改传入的文档
+
+        :param extend_dict: 附加到每个文档中的字段
+        :param ordered:     是否按顺序写入, 默认不按顺序(出错时其余文档仍会写入)
+        :param chunk_bytes: 每批写入的文档字节数预算
+        :param num_threads: 并发写入的线程数, 默认为连接池大小
+        :param upsert:      是否按upsert_keys幂等写入(存在则替换), 重复导入时不产生重复数据,
+                            建议在upsert_keys上建立索引
+        :param upsert_keys: 幂等写入时确定唯一文档的字段, 默认为(站点, 时间)
+        :return:            写入(含替换)的文档数
         """
-        if isinstance(data, dict):
-            data = [data]
+        if hasattr(data, 'to_docs'):            # 列式数据批批量转换为文档
+            docs = data.to_docs()
+            if extend_dict:
+                for e in docs:
+                    e.update(extend_dict)
+        else:
+            if isinstance(data, dict):
+                data = [data]
+            docs = [dict(e, **extend_dict) for e in data]   # 复制文档, insert会写入_id
         colle = self.db[coll_name]
-        if extend_dict:
-            for e in data:
-                e.update(extend_dict)
-        cnt = 0
-        chunk = 1000                # 一次最多存储的条数
-        data_len = len(data)
-        for st in range(0, data_len, chunk):
-            res = colle.insert_many(data[st: st+chunk])
-            cnt += len(res.inserted_ids)
-        logger.info(f"{cnt} document are inserted into {coll_name} collection in {self.db.name} database.")
+        chunks = split_chunks(docs, chunk_bytes)
+        if upsert:
+            write = lambda chunk: self._upsert_chunk(colle, chunk, upsert_keys, ordered)
+        else:
+            write = lambda chunk: len(colle.insert_many(chunk, ordered=ordered).inserted_ids)
+        num_threads = num_threads or self.max_pool_size
+        if num_threads <= 1 or len(chunks) <= 1:
+            cnt = sum(write(chunk) for chunk in chunks)
+        else:
+            with ThreadPoolExecutor(max_workers=min(num_threads, len(chunks))) as executor:
+                cnt = sum(executor.map(write, chunks))
+        logger.info(f"{cnt} document are {'upserted' if upsert else 'inserted'} into {coll_name} collection in {self.db.name} database.")
         return cnt
+
+    @staticmethod
+    def _upsert_chunk(colle, chunk: Sequence[dict], upsert_keys: Sequence[str], ordered: bool) -> int:
+        """以upsert_keys为唯一键批量替换或插入一批文档, 替换内容不含_id(已存在文档的_id不可修改)"""
+        requests = [ReplaceOne({k: e[k] for k in upsert_keys}, {k: v for k, v in e.items() if k != '_id'}, upsert=True)
+                    for e in chunk]
+        res = colle.bulk_write(requests, ordered=ordered)
+        return res.upserted_count + res.matched_count
     
     def update_one(self, coll_name: str, fit: dict, update: dict) -> bool:
         """更新集合中的单个文档
@@ -148,6 +287,34 @@ class MyMongodb:
         logger.debug(f"modify {res.modified_count} doc.")
         return res.modified_count
     
+    def ensure_index(self, coll_name: str, keys: Sequence[Tuple[str, int]]=TIME_INDEX, **kwargs) -> str:
+        """确保集合中存在指定键的索引(不存在时创建, 不会删除已有索引)
+
+        Args:
+            coll_name (str): 集合名
+            keys (Sequence[Tuple[str, int]], optional): 索引键及方向. Defaults to TIME_INDEX(站点, 时间).
+            **kwargs: 传给create_index的其它参数, 如unique
+
+        Returns:
+            str: 索引名
+        """
+        collection = self.db[coll_name]
+        keys = [(k, d) for k, d in keys]
+        for name, info in collection.index_information().items():
+            if [(k, d) for k, d in info['key']] == keys:
+                return name
+        index_name = collection.create_index(keys, **kwargs)
+        logger.info(f"create index {index_name} in {self.db.name}.{coll_name}.")
+        return index_name
+
+    def ensure_indexes(self, coll_names: Iterable[str], keys: Sequence[Tuple[str, int]]=TIME_INDEX, **kwargs) -> Dict[str, str]:
+        """为多个集合确保存在指定键的索引, 适合在启动时对配置的各集合调用
+
+        Returns:
+            Dict[str, str]: 集合名 -> 索引名
+        """
+        return {coll_name: self.ensure_index(coll_name, keys, **kwargs) for coll_name in coll_names}
+
     def create_single_index(self, coll_name, field_name):
         """
         创建升序索引（若存在会删除原有的）
@@ -205,20 +372,112 @@ class MyMongodb:
         """
         fs = gridfs.GridFS(self.db, collection=coll)
         return fs.get(id).read()
+
+    def upload_lfs(self, source: Union[str, IO, bytes, memoryview], filename: str, metadata: dict=None,
+                   coll: str='fs', chunk_size_bytes: int=None) -> ObjectId:
+        """以流的方式分块上传文件到存储桶, 不需要将整个文件读入内存
+
+        Args:
+            source (str / IO / bytes / memoryview): 本地文件路径、可读的二进制文件对象或内存中的文件内容
+            filename (str): 存储的文件名
+            metadata (dict, optional): 文件的元数据, 如站点、时间窗口等. Defaults to None.
+            coll (str, optional): 存储桶名. Defaults to 'fs'.
+            chunk_size_bytes (int, optional): GridFS分块大小, 默认为255KB. Defaults to None.
+
+        Returns:
+            ObjectId: 存储文件的_id
+        """
+        bucket = gridfs.GridFSBucket(self.db, bucket_name=coll)
+        kwargs = {} if chunk_size_bytes is None else {"chunk_size_bytes": chunk_size_bytes}
+        grid_in = bucket.open_upload_stream(filename, metadata=metadata, **kwargs)
+        try:
+            if isinstance(source, (bytes, bytearray, memoryview)):
+                view = memoryview(source)
+                for st in range(0, len(view), STREAM_BLOCK):        # 切片不复制数据
+                    grid_in.write(view[st: st+STREAM_BLOCK])
+            elif isinstance(source, str):
+                with open(source, 'rb') as fp:
+                    for block in iter(lambda: fp.read(STREAM_BLOCK), b''):
+                        grid_in.write(block)
+            else:
+                for block in iter(lambda: source.read(STREAM_BLOCK), b''):
+                    grid_in.write(block)
+        except BaseException:
+            grid_in.abort()                                         # 删除已上传的分块
+            raise
+        grid_in.close()
+        logger.info(f"upload {filename} ({grid_in.length} bytes) to {self.db.name}.{coll}.")
+        return grid_in._id
+
+    def open_lfs(self, file: Union[ObjectId, str], coll: str='fs') -> gridfs.GridOut:
+        """打开存储桶中的文件用于流式读取, 返回可seek的只读文件对象(可直接传给xarray.open_dataset(engine='h5netcdf'))
+
+        Args:
+            file (ObjectId / str): 文件_id, 或文件名(同名时取最新版本)
+            coll (str, optional): 存储桶名. Defaults to 'fs'.
+        """
+        bucket = gridfs.GridFSBucket(self.db, bucket_name=coll)
+        if isinstance(file, ObjectId):
+            return bucket.open_download_stream(file)
+        return bucket.open_download_stream_by_name(file)
+
+    def download_lfs(self, file: Union[ObjectId, str], dest: Union[str, IO], coll: str='fs') -> int:
+        """将存储桶中的文件分块流式写入本地文件或文件对象, 返回写入的字节数
+
+        Args:
+            file (ObjectId / str): 文件_id, 或文件名(同名时取最新版本)
+            dest (str / IO): 本地文件路径或可写的二进制文件对象
+            coll (str, optional): 存储桶名. Defaults to 'fs'.
+        """
+        grid_out = self.open_lfs(file, coll)
+        fp = open(dest, 'wb') if isinstance(dest, str) else dest
+        size = 0
+        try:
+            for block in iter(lambda: grid_out.read(STREAM_BLOCK), b''):
+                fp.write(block)
+                size += len(block)
+        finally:
+            grid_out.close()
+            if isinstance(dest, str):
+                fp.close()
+        return size
+
+    def find_lfs(self, filter: dict=None, coll: str='fs') -> List[dict]:
+        """按条件(如{"metadata.station": "R7253"})查询存储桶中的文件信息"""
+        return list(self.db[f"{coll}.files"].find(filter or {}))
         
+    def metrics(self) -> dict:
+        """
+        本进程中mongo客户端的连接池及操作耗时统计: 连接池大小、当前连接数及占用数、
+        取用连接的累计/最长等待时间(秒)、各命令的次数/失败数/累计及最长耗时(秒)
+        """
+        return dict(max_pool_size=self.max_pool_size, **METRICS.snapshot())
+
     def close_mongodb_client(self):
         """
-        关闭MongoDB数据库连接
+        关闭MongoDB数据库连接; 共享的客户端只释放本对象的引用, 最后一个持有者关闭时才真正关闭, 可重复调用
         """
-        self.client.close()
+        if getattr(self, 'shared', False):
+            if not getattr(self, '_released', False):
+                release_client(self.client)
+                self._released = True
+        else:
+            self.client.close()
 
 
 def get_mongo_cilent():
+    """按环境变量(可写在.env文件中)配置获取数据库对象, 同一进程内共享一个延迟连接的客户端(连接池), fork出的子进程中会重新创建"""
+    global _DOTENV_LOADED
+    if not _DOTENV_LOADED:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _DOTENV_LOADED = True
     return MyMongodb(os.getenv('MONGO_IP'), 
                      os.getenv('MONGO_USER'),
                      os.getenv('MONGO_PASSWD'),
                      os.getenv('MONGO_DB'),
-                     maxPoolSize=10)
+                     maxPoolSize=int(os.getenv('MONGO_POOL_SIZE', 10)),
+                     shared=True)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,168 @@
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Tuple
+
+import pymongo
+from pymongo import monitoring
+
+from log.metrics import METRICS as STAGE_METRICS
+
+
+class MongoMetrics(monitoring.CommandListener, monitoring.ConnectionPoolListener):
+    """通过pymongo事件监听统计连接池及各操作的耗时, 每个进程一份"""
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        """清空统计数据"""
+        with self._lock:
+            self.connections = 0                    # 当前打开的连接数
+            self.checked_out = 0                    # 当前被占用的连接数
+            self.checkouts = 0                      # 累计取用连接的次数
+            self.checkout_failed = 0                # 取用连接失败(超时等)的次数
+            self.checkout_wait = 0.                 # 累计等待取用连接的时间(秒)
+            self.checkout_wait_max = 0.             # 单次等待取用连接的最长时间(秒)
+            self.commands = defaultdict(lambda: {"count": 0, "failed": 0, "total": 0., "max": 0.})   # 命令名 -> 耗时统计(秒)
+
+    def snapshot(self) -> Dict:
+        """返回当前统计数据的副本"""
+        with self._lock:
+            return {
+                "connections": self.connections,
+                "checked_out": self.checked_out,
+                "checkouts": self.checkouts,
+                "checkout_failed": self.checkout_failed,
+                "checkout_wait": self.checkout_wait,
+                "checkout_wait_max": self.checkout_wait_max,
+                "commands": {name: dict(stat) for name, stat in self.commands.items()},
+            }
+
+    # 命令事件
+    def started(self, event):
+        pass
+
+    def _command_done(self, event, failed: bool):
+        duration = event.duration_micros / 1e6
+        with self._lock:
+            stat = self.commands[event.command_name]
+            stat["count"] += 1
+            stat["failed"] += failed
+            stat["total"] += duration
+            stat["max"] = max(stat["max"], duration)
+        STAGE_METRICS.incr('mongo_round_trips', command=event.command_name)
+        STAGE_METRICS.observe('mongo_command', duration, command=event.command_name)
+
+    def succeeded(self, event):
+        self._command_done(event, False)
+
+    def failed(self, event):
+        self._command_done(event, True)
+
+    # 连接池事件
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.connections += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections -= 1
+
+    def connection_check_out_started(self, event):
+        self._local.checkout_st = time.perf_counter()      # 取用连接的开始与结束事件在同一线程中触发
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failed += 1
+
+    def connection_checked_out(self, event):
+        wait = time.perf_counter() - getattr(self._local, 'checkout_st', time.perf_counter())
+        with self._lock:
+            self.checked_out += 1
+            self.checkouts += 1
+            self.checkout_wait += wait
+            self.checkout_wait_max = max(self.checkout_wait_max, wait)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+
+METRICS = MongoMetrics()
+_CLIENTS: Dict[Tuple[str, int], pymongo.MongoClient] = {}      # (连接串, 连接池大小) -> 本进程共享的客户端
+_HOLDERS: Dict[Tuple[str, int], int] = {}                       # (连接串, 连接池大小) -> 持有共享客户端的对象数
+_CLIENTS_PID = os.getpid()                                      # 创建_CLIENTS中客户端的进程
+_LOCK = threading.Lock()
+
+
+def _reset_after_fork():
+    """子进程中丢弃父进程创建的客户端(不关闭, 其连接属于父进程)及统计数据"""
+    global _CLIENTS_PID, _LOCK
+    _LOCK = threading.Lock()
+    _CLIENTS.clear()
+    _HOLDERS.clear()
+    _CLIENTS_PID = os.getpid()
+    METRICS._lock = threading.Lock()
+    METRICS.reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def shared_client(link: str, maxPoolSize: int=10, **kwargs) -> pymongo.MongoClient:
+    """获取本进程共享的MongoClient, 首次调用时创建(不立即连接), 同一进程内相同连接串及连接池大小复用同一客户端,
+    fork出的子进程中会重新创建. 每次调用都计为一个持有者, 需与release_client成对调用
+
+    Args:
+        link (str): mongo连接串
+        maxPoolSize (int, optional): 连接池大小. Defaults to 10.
+        **kwargs: 传给MongoClient的其它参数
+
+    Returns:
+        pymongo.MongoClient: 共享的客户端
+    """
+    if os.getpid() != _CLIENTS_PID:                 # 不支持register_at_fork的平台
+        _reset_after_fork()
+    key = (link, maxPoolSize)
+    with _LOCK:
+        client = _CLIENTS.get(key)
+        if client is None:
+            client = _CLIENTS[key] = pymongo.MongoClient(link, maxPoolSize=maxPoolSize, connect=False,
+                                                         event_listeners=[METRICS], **kwargs)
+        _HOLDERS[key] = _HOLDERS.get(key, 0) + 1
+        return client
+
+
+def release_client(client: pymongo.MongoClient):
+    """释放一个持有者对共享客户端的引用, 最后一个持有者释放时关闭客户端并将其移出本进程的缓存;
+    不在缓存中的客户端(如fork前父进程创建的)不做处理"""
+    with _LOCK:
+        for key, value in list(_CLIENTS.items()):
+            if value is client:
+                _HOLDERS[key] -= 1
+                if _HOLDERS[key] > 0:
+                    return
+                del _CLIENTS[key], _HOLDERS[key]
+                break
+        else:
+            return
+    client.close()
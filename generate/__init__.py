@@ -1,2 +1,26 @@
+import importlib
 
-from .core import NcGenerator
\ No newline at end of file
+# 公开对象 -> 所在子模块, 首次访问时才导入子模块(及netCDF4/numpy等依赖), 缩短导入generate的时间
+_EXPORTS = {
+    'NcGenerator': '.core', 'NoDataError': '.core',
+    'RecordBatch': '.columnar',
+    'NcPlan': '.plan', 'compile_plan': '.plan',
+    'NcJob': '.batch', 'JobResult': '.batch', 'generate_many': '.batch',
+    'export_collection': '.export', 'iter_windows': '.export',
+    'JsonWatermarkStore': '.incremental', 'MongoWatermarkStore': '.incremental', 'export_incremental': '.incremental',
+    'parse_to_nc': '.pipeline',
+    'generate_to_gridfs': '.archive', 'publish_nc': '.archive',
+}
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    if name in _EXPORTS:
+        value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
\ No newline at end of file
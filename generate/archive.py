@@ -0,0 +1,96 @@
+import os
+from datetime import datetime, timedelta
+from logging import getLogger
+from typing import IO, Iterable, Union
+
+from .core import NcGenerator
+
+
+logger = getLogger(os.path.basename(__file__))
+
+BUCKET = 'nc_files'                             # 默认的GridFS存储桶名
+
+
+def archive_metadata(generator: NcGenerator, station: str='', win_st: datetime=None,
+                     window: Union[str, timedelta]='daily', count: int=None, **extra) -> dict:
+    """构建nc文件在GridFS中的元数据: 站点、时间窗口、生成配置的指纹及记录数
+
+    Args:
+        generator (NcGenerator): 生成文件所用的生成器
+        station (str, optional): 站点. Defaults to ''.
+        win_st (datetime, optional): 时间窗口起点. Defaults to None.
+        window (str / timedelta, optional): 时间窗口长度. Defaults to 'daily'.
+        count (int, optional): 文件中的记录数. Defaults to None.
+        **extra: 其它元数据
+    """
+    metadata = {
+        "station": station,
+        "window_start": win_st,
+        "window": window if isinstance(window, str) else str(window),
+        "config": generator.plan.fingerprint,
+        "records": count,
+    }
+    metadata.update(extra)
+    return metadata
+
+
+def publish_nc(db_client, generator: NcGenerator, source: Union[str, IO, bytes, memoryview], filename: str=None,
+               station: str='', win_st: datetime=None, window: Union[str, timedelta]='daily', count: int=None,
+               bucket: str=BUCKET, **extra):
+    """将已生成的nc文件(本地路径、文件对象或内存内容)流式上传到GridFS, 附带站点、窗口及配置指纹等元数据
+
+    Args:
+        db_client (MyMongodb): 数据库对象
+        generator (NcGenerator): 生成文件所用的生成器
+        source (str / IO / bytes / memoryview): nc文件
+        filename (str, optional): 存储的文件名, 为None时source为路径则取其文件名, 否则按生成器配置生成. Defaults to None.
+        station (str, optional): 站点. Defaults to ''.
+        win_st (datetime, optional): 时间窗口起点. Defaults to None.
+        window (str / timedelta, optional): 时间窗口长度. Defaults to 'daily'.
+        count (int, optional): 文件中的记录数. Defaults to None.
+        bucket (str, optional): 存储桶名. Defaults to BUCKET.
+
+    Raises:
+        ValueError: source不是路径且未给出filename时, 缺少win_st或生成器未配置文件名
+
+    Returns:
+        ObjectId: 存储文件的_id
+    """
+    if filename is None:
+        if isinstance(source, str):
+            filename = os.path.basename(source)
+        elif win_st is None or generator.name is None:
+            raise ValueError("filename must be given when win_st is None or the 'name' item is not configured.")
+        else:
+            filename = generator.generate_fileanme(win_st, station_code=station)
+    metadata = archive_metadata(generator, station, win_st, window, count, **extra)
+    return db_client.upload_lfs(source, filename, metadata=metadata, coll=bucket)
+
+
+def generate_to_gridfs(generator: NcGenerator, db_client, datas: Iterable, station: str='', win_st: datetime=None,
+                       window: Union[str, timedelta]='daily', filename: str=None, bucket: str=BUCKET,
+                       batch_size: int=1000, **extra):
+    """在内存中生成nc文件后直接上传到GridFS, 不产生临时文件, 上传时不再复制文件内容
+
+    Args:
+        generator (NcGenerator): nc生成器
+        db_client (MyMongodb): 数据库对象
+        datas (Iterable / RecordBatch): 数据字典的可迭代对象, 或RecordBatch及其可迭代对象
+        station (str, optional): 站点. Defaults to ''.
+        win_st (datetime, optional): 时间窗口起点, 未给出filename时用于生成文件名. Defaults to None.
+        window (str / timedelta, optional): 时间窗口长度. Defaults to 'daily'.
+        filename (str, optional): 存储的文件名, 为None时按生成器配置生成. Defaults to None.
+        bucket (str, optional): 存储桶名. Defaults to BUCKET.
+        batch_size (int, optional): 每批写入的数据条数. Defaults to 1000.
+
+    Raises:
+        ValueError: 未给出filename时缺少win_st, 见publish_nc
+
+    Returns:
+        ObjectId: 存储文件的_id
+    """
+    buffer, count = generator.gerneral_nc_memory(datas, batch_size=batch_size)
+    try:
+        return publish_nc(db_client, generator, buffer, filename, station, win_st, window, count, bucket, **extra)
+    finally:
+        buffer.release()
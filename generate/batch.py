@@ -0,0 +1,126 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from logging import getLogger
+from typing import Iterable, List, Optional, Union
+
+from .core import NcGenerator, NoDataError, start_log_queue
+from .plan import NcPlan, compile_plan
+from .prefetch import prefetch_docs
+from log import init_worker_logging
+from log.metrics import METRICS
+from log.profiling import profiled
+
+
+logger = getLogger(os.path.basename(__file__))
+
+_GENERATOR: Optional[NcGenerator] = None        # 工作进程内复用的生成器
+_MONGO = None                                   # 工作进程内复用的mongo客户端, 首次查询时创建
+_BATCH_SIZE = 1000                              # 每批写入的数据条数
+
+
+@dataclass
+class NcJob:
+    """单个nc文件的生成任务, 数据来源二选一: 直接给出datas, 或按coll_name/sql从mongo查询"""
+    nc_path: str                                # 生成的nc文件路径
+    coll_name: Optional[str] = None             # 查询的集合名
+    sql: Optional[dict] = None                  # 查询条件
+    sortby: Union[str, list, None] = 'Datetime' # 排序字段
+    datas: Optional[Iterable] = None            # 直接给出的数据字典列表
+    hint: Optional[list] = None                 # 查询强制使用的索引
+
+
+@dataclass
+class JobResult:
+    """单个任务的执行结果"""
+    nc_path: str
+    ok: bool
+    count: int = 0                              # 写入的数据条数
+    skipped: bool = False                       # 无数据而跳过
+    error: str = ''                             # 失败原因
+    elapsed: float = 0.                         # 耗时(秒)
+    metrics: Optional[dict] = None              # 工作进程中本任务的阶段耗时及计数统计
+
+
+def _init_worker(plan: NcPlan, batch_size: int, log_queue=None):
+    global _GENERATOR, _BATCH_SIZE
+    init_worker_logging(log_queue)                  # 日志经队列交给主进程写入, 不再各自打开日志文件
+    _GENERATOR = NcGenerator(plan)
+    _BATCH_SIZE = batch_size
+
+
+def _worker_client():
+    global _MONGO
+    if _MONGO is None:
+        from dbcontroller import get_mongo_cilent
+        _MONGO = get_mongo_cilent()
+    return _MONGO
+
+
+def _run_job(job: NcJob) -> JobResult:
+    with profiled(job.nc_path):                     # 设置环境变量DATASET_PROFILE时每个任务各自保存分析结果
+        result = _generate_job(job)
+    result.metrics = METRICS.snapshot()             # 每个任务返回本任务的统计, 由主进程汇总
+    METRICS.reset()
+    return result
+
+
+def _generate_job(job: NcJob) -> JobResult:
+    st = time.perf_counter()
+    try:
+        if job.datas is not None:
+            datas = job.datas
+        else:
+            datas = prefetch_docs(_worker_client(), job.coll_name, _GENERATOR, sql=job.sql, sortby=job.sortby,
+                                  hint=job.hint, batch_size=_BATCH_SIZE)
+        count = _GENERATOR.gerneral_nc_stream(job.nc_path, datas, batch_size=_BATCH_SIZE)
+        return JobResult(job.nc_path, True, count, elapsed=time.perf_counter() - st)
+    except NoDataError:
+        return JobResult(job.nc_path, True, skipped=True, elapsed=time.perf_counter() - st)
+    except Exception as exc:
+        return JobResult(job.nc_path, False, error=f"{type(exc).__name__}: {exc}", elapsed=time.perf_counter() - st)
+
+
+def generate_many(nc_config: Union[dict, NcPlan], jobs: List[NcJob], num_workers: int=4, batch_size: int=1000) -> List[JobResult]:
+    """使用进程池并行生成多个nc文件, 每个工作进程复用同一写入计划及各自的mongo客户端,
+    工作进程的日志经队列交给主进程统一写入
+
+    Args:
+        nc_config (Dict / NcPlan): 生成配置字典或已编译的写入计划
+        jobs (List[NcJob]): 生成任务列表
+        num_workers (int, optional): 工作进程数. Defaults to 4.
+        batch_size (int, optional): 每批写入的数据条数. Defaults to 1000.
+
+    Returns:
+        List[JobResult]: 与jobs顺序一致的执行结果
+    """
+    from tqdm import tqdm
+    plan = nc_config if isinstance(nc_config, NcPlan) else compile_plan(nc_config)
+    results = [None] * len(jobs)
+    log_queue = start_log_queue()
+    with ProcessPoolExecutor(max_workers=num_workers, initializer=_init_worker, initargs=(plan, batch_size, log_queue)) as executor:
+        futures = {executor.submit(_run_job, job): i for i, job in enumerate(jobs)}
+        for future in tqdm(as_completed(futures), total=len(futures)):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+                if results[i].metrics:
+                    METRICS.merge(results[i].metrics)
+            except Exception as exc:                # 工作进程异常退出等
+                results[i] = JobResult(jobs[i].nc_path, False, error=f"{type(exc).__name__}: {exc}")
+    summarize(results)
+    return results
+
+
+def summarize(results: List[JobResult]):
+    """汇总并记录任务执行结果及阶段耗时统计(结构化json), 设置了环境变量METRICS_TEXTFILE时同时写出Prometheus textfile"""
+    failed = [r for r in results if not r.ok]
+    skipped = sum(r.skipped for r in results)
+    total = sum(r.count for r in results)
+    logger.info(f"{len(results) - len(failed) - skipped}/{len(results)} nc files generated, {skipped} skipped without data, {total} records.")
+    for r in failed:
+        logger.error(f"failed to generate {r.nc_path}: {r.error}")
+    METRICS.log(logger, files=len(results), failed=len(failed))
+    if os.getenv('METRICS_TEXTFILE'):
+        METRICS.write_prometheus(os.getenv('METRICS_TEXTFILE'))
@@ -0,0 +1,104 @@
+from dataclasses import dataclass, field
+from itertools import chain
+from typing import Any, Dict, Iterable, List, Sequence
+
+import numpy as np
+
+
+@dataclass
+class RecordBatch:
+    """列式数据批: 逐条变化的数据以numpy数组按键保存(第一维为记录数), 整批相同的字段(站点信息、高度层等)只保存一份,
+    用于在解析器、数据库和nc生成器之间代替List[Dict]传递数据
+    """
+    columns: Dict[str, np.ndarray]                          # 键 -> 数组, 第一维为记录数
+    head: Dict[str, Any] = field(default_factory=dict)      # 整批相同的字段, 值为标量或数组(列表)
+
+    def __post_init__(self):
+        self.columns = {k: np.asarray(v) for k, v in self.columns.items()}
+        lengths = {k: len(v) for k, v in self.columns.items()}
+        if len(set(lengths.values())) > 1:
+            raise ValueError(f"columns must have the same length, got {lengths}")
+
+    def __len__(self) -> int:
+        for v in self.columns.values():
+            return len(v)
+        return 0
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.columns or key in self.head
+
+    def column(self, key: str) -> np.ndarray:
+        """获取键对应的数组, 整批相同的字段会广播为第一维与记录数等长的数组(数组值广播为只读视图, 不复制)"""
+        if key in self.columns:
+            return self.columns[key]
+        value = self.head[key]
+        if isinstance(value, str):
+            return np.full(len(self), value, dtype=object)
+        value = np.asarray(value)
+        return np.broadcast_to(value, (len(self), ) + value.shape)
+
+    def record(self, i: int) -> Dict[str, Any]:
+        """获取第i条记录的字典形式"""
+        rec = dict(self.head)
+        for k, v in self.columns.items():
+            value = v[i]
+            rec[k] = value.tolist() if hasattr(value, 'tolist') else value     # numpy类型转换为python对象
+        return rec
+
+    def slice(self, start: int, stop: int) -> 'RecordBatch':
+        """按记录切片, 各列为原数组的视图"""
+        return RecordBatch({k: v[start: stop] for k, v in self.columns.items()}, self.head)
+
+    def take(self, indices: Sequence) -> 'RecordBatch':
+        """按下标或布尔掩码选取记录"""
+        return RecordBatch({k: v[indices] for k, v in self.columns.items()}, self.head)
+
+    def to_docs(self) -> List[Dict[str, Any]]:
+        """批量转换为mongo文档(字典)列表"""
+        keys = list(self.columns.keys())
+        values = [self.columns[k].tolist() for k in keys]
+        return [dict(self.head, **dict(zip(keys, row))) for row in zip(*values)]
+
+    @classmethod
+    def from_docs(cls, docs: Sequence[Dict[str, Any]], head_keys: Iterable[str]=(), dtypes: Dict[str, Any]=None) -> 'RecordBatch':
+        """由mongo文档(字典)列表批量构建, head_keys中的字段取第一条文档的值, 其余字段(不含_id)按列转换为数组
+
+        Args:
+            docs (Sequence[Dict]): 文档列表
+            head_keys (Iterable[str], optional): 整批相同的字段. Defaults to ().
+            dtypes (Dict[str, Any], optional): 指定列的数据类型. Defaults to None.
+        """
+        if len(docs) == 0:
+            return cls({})
+        dtypes = dtypes or {}
+        head_keys = set(head_keys)
+        head = {k: docs[0][k] for k in head_keys if k in docs[0]}
+        columns = {k: np.asarray([d[k] for d in docs], dtype=dtypes.get(k)) for k in docs[0] if k not in head_keys and k != '_id'}
+        return cls(columns, head)
+
+    @classmethod
+    def concat(cls, batches: Sequence['RecordBatch']) -> 'RecordBatch':
+        """沿记录拼接多个数据批, 各数据批中相同的整批字段保留在head中, 值不同的整批字段转换为列
+
+        Raises:
+            ValueError: 某个数据批(的列及标量字段中)缺少其它数据批中的键
+        """
+        batches = [b for b in batches if len(b)]
+        if len(batches) == 0:
+            return cls({})
+        keys = list(dict.fromkeys(k for b in batches for k in chain(b.columns, b.head)))
+        for i, b in enumerate(batches):
+            missing = [k for k in keys if k not in b]
+            if missing:
+                raise ValueError(f"batch {i} has no keys {missing}, all batches to concat must have the same keys.")
+        first = batches[0]
+        head = {k: first.head[k] for k in keys
+                if all(k not in b.columns and _same(b.head[k], first.head[k]) for b in batches)}
+        return cls({k: np.concatenate([b.column(k) for b in batches]) for k in keys if k not in head}, head)
+
+
+def _same(a, b) -> bool:
+    try:
+        return bool(np.all(np.asarray(a) == np.asarray(b)))
+    except ValueError:                                      # 形状不一致
+        return False
@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Any, Tuple
+from typing import Any, Optional, Tuple
 
 
 @dataclass(frozen=True)
@@ -19,6 +19,20 @@ class NcType:
     string: str = 'str'
 
 
+@dataclass(frozen=True)
+class NcStorage:
+    """nc变量的存储选项, 可作为配置元组的最后一项, 未配置时使用默认值
+    """
+    compression: Optional[str] = 'zlib'     # 压缩方式: zlib/zstd/bzip2/szip/blosc_lz/blosc_lz4/blosc_lz4hc/blosc_zlib/blosc_zstd, None为不压缩
+    complevel: int = 4                      # 压缩级别
+    shuffle: bool = True                    # 是否开启shuffle过滤器
+    chunksizes: Optional[Tuple[int, ...]] = None    # 分块形状, None时沿不限长维度自动确定
+    significant_digits: Optional[int] = None        # 量化保留的有效数字位数(仅浮点型)
+    quantize_mode: str = 'BitGroom'                 # 量化算法: BitGroom/BitRound/GranularBitRound
+    least_significant_digit: Optional[int] = None   # 保留的小数位数(仅浮点型)
+    fletcher32: bool = False                # 是否开启fletcher32校验
+
+
 @dataclass
 class NcDim:
     name: str
@@ -55,6 +69,7 @@ class BaseObsData:
     dim: Tuple[NcDim]      # nc变量维度
     longname: str   # nc变量longname属性
     units: str      # nc变量units属性
+    storage: Optional[NcStorage] = None    # nc变量存储选项
 
 
 @dataclass
@@ -67,4 +82,5 @@ class BaseHeadData:
     dim: Tuple[NcDim]      # nc变量维度
     longname: str   # nc变量longname属性
     units: str      # nc变量units属性
-    value: Any      # 头文件描述字段nc变量的默认初始值
\ No newline at end of file
+    value: Any      # 头文件描述字段nc变量的默认初始值
+    storage: Optional[NcStorage] = None    # nc变量存储选项
\ No newline at end of file
@@ -7,4 +7,4 @@ Description:
 
 Copyright (c) 2023 by Zhongxiaowei, All Rights Reserved. 
 '''
-from .BaseType import NcType
+from .BaseType import NcType, NcStorage
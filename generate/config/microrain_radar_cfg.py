@@ -57,7 +57,7 @@ MicroRianRadarRawNCINFO = {
                 ('-', ('Dataset_version', NcType.string, (), 'Dataset version', '-', '1.0')),
             ]
         },
-    # (input_data_name, (name, nc_typ, dim, longname, units))
+    # (input_data_name, (name, nc_typ, dim, longname, units)), 可在末尾追加NcStorage配置压缩、分块及量化
     "observation": 
         [
             ('Datetime', NcType.string, (Datetime, ), 'Datetime', 'yyyy-mm-dd hh:mm:ss'),
@@ -1,139 +1,116 @@
-from copy import deepcopy
 from datetime import datetime
 import logging
 import os
 import time
-from typing import Dict, List, Tuple, Union
+from itertools import chain
+from typing import Any, Dict, Iterable, Iterator, List, Tuple, Union
 from pprint import pformat
 import netCDF4 as nc
 import numpy as np
 
-from .config.BaseType import NcDim, NcName, NcType, BaseHeadData, BaseObsData
-from log import get_default_logger
+from .config.BaseType import NcType, BaseHeadData, BaseObsData
+from .columnar import RecordBatch
+from .plan import NcPlan, compile_plan
+from log import setup_default_logging, start_queue_logging
+from log.metrics import incr, timer
+from log.profiling import profiled
 
 
-logger = get_default_logger(os.path.basename(__file__), log_path=os.path.join(os.path.dirname(os.path.dirname(__file__)), "log/log.txt"))
+LOG_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "log/log.txt")
+logger = logging.getLogger(os.path.basename(__file__))
 logger.setLevel(logging.INFO)
+_LOGGING_READY = False                  # 是否已配置默认日志(控制台及LOG_PATH), 在第一次创建生成器时配置, 导入时不操作文件
+# 生成流程记录的阶段耗时(log.metrics):
+#   head_update: 计算描述信息的值
+#   column_assembly: 列式组装观测要素
+#   variable_write: 各变量的写入调用, 不含延后到分块从缓存写出时才进行的压缩
+#   close: 关闭文件, 含分块缓存的写出及其压缩, 压缩的耗时大多计入此阶段
+
+
+def _setup_logging():
+    global _LOGGING_READY
+    if not _LOGGING_READY:
+        setup_default_logging(log_path=LOG_PATH)
+        _LOGGING_READY = True
+
+
+def start_log_queue():
+    """在主进程中开启队列日志(控制台及LOG_PATH), 返回传给工作进程init_worker_logging的日志队列;
+    日志文件只由主进程的监听线程写入, 工作进程不再各自打开LOG_PATH"""
+    global _LOGGING_READY
+    _LOGGING_READY = True
+    return start_queue_logging(log_path=LOG_PATH)
+
+
+class NoDataError(ValueError):
+    """没有可用于生成nc文件的数据"""
 
 
 class NcGenerator(object):
     def __init__(self,
-                 nc_config: dict,
+                 nc_config: Union[dict, NcPlan],
                  head_data_cls = BaseHeadData,
                  observation_data_cls = BaseObsData
                  ) -> None:
         """nc文件信息类
         Args:
-            nc_config (Dict): 生成配置字典,包含三个键值对,分别是描述信息desc, 要素信息obs, 文件名name,注意只有'name'是指定键名,用于生成文件名,其余两个键可自定义名称
+            nc_config (Dict / NcPlan): 生成配置字典或已编译的写入计划. 配置字典包含三个键值对,分别是描述信息desc, 要素信息obs, 文件名name,注意只有'name'是指定键名,用于生成文件名,其余两个键可自定义名称
                 desc (Dict[List[Tuple]] / List[Tuple]): 描述信息元组字典或列表：{"grop_name": [(db_key, (name, nc_typ, dim, longname, units, value)), ...], ...}
                 obs (Dict[List[Tuple]] / List[Tuple]): 要素信息元组字典或列表： {"group_name": [(name, nc_typ, dim, longname, units), ...] 或 [(db_key, (name, nc_typ, dim, longname, units)), ...], ...}
                 name (List): nc文件名配置参数
-        """    
-        self.unique_dims = set()                    # 维度信息
-        self.nc2data = {}                           # nc变量到实际数据名的映射表
-        name = nc_config.get('name', None)
-        if name is None:
-            self.name = None
+        """
+        _setup_logging()
+        if isinstance(nc_config, NcPlan):
+            self.plan = nc_config
         else:
-            self.name = NcName(*nc_config.pop('name'))  # 生成的nc文件名
-        keys = list(nc_config.keys())
-        if len(keys) == 0:
-            raise ValueError(f"There are no valid data items in the configuration:\n{nc_config}")
-        assert len(keys) == 2, f"Two items must be configured in:\n{nc_config}"
-        self.head = self._parse_dict({keys[0]: nc_config.pop(keys[0])}, DataClass=head_data_cls)                          # 头部描述信息
-        self.observation = self._parse_dict(nc_config, DataClass=observation_data_cls)     # 要素信息
-        self.unique_dims = list(self.unique_dims)
-          
-    def _parse_datas(self, datas: Union[Tuple | List[Tuple]], DataClass):
-        if not isinstance(datas, list):
-            datas = [datas]
-        grpl = []
-        for row in datas:
-            if len(row) == 2 and isinstance(row[1], tuple):
-                if row[0] == '+':           # 实际变量名与生成nc文件名相同
-                    grpl.append(DataClass(row[1][0], *row[1]))
-                    self.nc2data[row[1][0]] = row[1][0]
-                elif row[0] == '-':         # 无实际变量名，仅使用默认值生成
-                    if issubclass(DataClass, BaseHeadData):
-                        grpl.append(DataClass(None, *row[1]))
-                    elif issubclass(DataClass, BaseObsData):
-                        raise ValueError(f"{DataClass} no support use '-' to omit data.")
-                    else:
-                        raise ValueError(f"unknown DataClass:{DataClass}")
-                else:
-                    grpl.append(DataClass(row[0], *row[1]))
-                    self.nc2data[row[1][0]] = row[0]
-            elif isinstance(row, tuple):    # 实际变量名与生成nc文件名相同
-                grpl.append(DataClass(row[0], *row))
-                self.nc2data[row[0]] = row[0]
-            else:
-                raise ValueError(f"not support formate at {row}")
-            var_dims = []                   # 记录每个变量的实际的维度变量名,方便生成直接使用
-            for _dim in grpl[-1].dim:       # 记录唯一维度信息
-                self.unique_dims.add(NcDim(*_dim))
-                var_dims.append(_dim[0])
-            grpl[-1].dim = tuple(var_dims)
-                
-        return grpl
-
-    def _parse_dict(self, data: dict, DataClass):
-        res = {}
-        def _recursion(data, DataClass, res):
-            for grpName, grpData in data.items():
-                if isinstance(grpData, dict):
-                    res[grpName] = _recursion(grpData, DataClass, deepcopy(res))
-                elif isinstance(grpData, (list, tuple)):
-                    res[grpName] = self._parse_datas(grpData, DataClass)
-                else:
-                    raise ValueError(f"values of {grpName} must be {DataClass}.")
-            return res
-        _recursion(data, DataClass, res)
-        return res
-
-    def generate_fileanme(self, start_time):
+            self.plan = compile_plan(nc_config, head_data_cls, observation_data_cls)   # 相同配置只编译一次
+        self.name = self.plan.name                          # 生成的nc文件名
+        self.head = self.plan.head                          # 头部描述信息
+        self.observation = self.plan.observation            # 要素信息
+        self.nc2data = dict(self.plan.nc2data)              # nc变量到实际数据名的映射表
+        self.unique_dims = list(self.plan.dims)             # 维度信息
+        self.source_keys = self.plan.source_keys            # 需要从数据中读取的键, 可用于数据库查询的投影
+
+    def generate_fileanme(self, start_time: Union[str, datetime], station_code: str=''):
         """生成nc文件名
 
         Args:
-            start_time (_type_): _description_
+            start_time (str / datetime): 数据起始时间, 字符串格式为"%Y-%m-%d %H:%M:%S", 可带毫秒
+            station_code (str, optional): 站点代码, 为空时使用配置中的站点代码. Defaults to ''.
 
         Returns:
-            _type_: _description_
+            str: nc文件名, 未配置文件名时返回空字符串
         """
         if self.name is None:
             return ''
-        try:
-            start_time = datetime.strptime(start_time, "%Y-%m-%d %H:%M:%S").strftime("%Y%m%d_%H%M%S")
-        except ValueError:
-            # 带毫秒数据的处理
-            dt_str, ms_str = start_time.split('.')
-            ms_str = "_" + ms_str
-            start_time = datetime.strptime(dt_str, "%Y-%m-%d %H:%M:%S").strftime("%Y%m%d_%H%M%S") + ms_str
-        # 依次对各项数据进行连接
-        if self.name.station_code:
-            filename = "_".join((self.name.class01,
-                                 self.name.class02,
-                                 self.name.class03,
-                                 self.name.class04,
-                                 self.name.base,
-                                 self.name.station_code,
-                                 self.name.data_code,
-                                 self.name.manufacturer_code,
-                                 self.name.data_level,
-                                 start_time))
+        if isinstance(start_time, datetime):
+            start_time = start_time.strftime("%Y%m%d_%H%M%S")
         else:
-            filename = "_".join((self.name.class01,
-                                 self.name.class02,
-                                 self.name.class03,
-                                 self.name.class04,
-                                 self.name.base,
-                                 self.name.data_code,
-                                 self.name.manufacturer_code,
-                                 self.name.data_level,
-                                 start_time))
-        if self.name.format_code is not None:
+            try:
+                start_time = datetime.strptime(start_time, "%Y-%m-%d %H:%M:%S").strftime("%Y%m%d_%H%M%S")
+            except ValueError:
+                # 带毫秒数据的处理
+                dt_str, ms_str = start_time.split('.')
+                ms_str = "_" + ms_str
+                start_time = datetime.strptime(dt_str, "%Y-%m-%d %H:%M:%S").strftime("%Y%m%d_%H%M%S") + ms_str
+        station_code = station_code or self.name.station_code
+        # 依次对各项数据进行连接, 站点代码为空时省略
+        items = [self.name.class01,
+                 self.name.class02,
+                 self.name.class03,
+                 self.name.class04,
+                 self.name.base]
+        if station_code:
+            items.append(station_code)
+        items += [self.name.data_code,
+                  self.name.manufacturer,
+                  self.name.data_level,
+                  start_time]
+        filename = "_".join(items)
+        if self.name.format_code:
             filename = f"{filename}_{self.name.format_code}"
-        # 质控选项, 默认为TRUE
-        if self.name.is_quality_control:
+        # 质控选项
+        if self.name.quality_control:
             filename += '_QC'
         filename += '.nc'
         
@@ -144,64 +121,287 @@ class NcGenerator(object):
             dim_var = nc_obj.createDimension(dim_info.name, dim_info.value)
             logger.debug(f"create dim_var:{dim_var.name} size:{dim_var.size}")
             
-    def _update_head(self, data, current_dict, time_st="", time_end=""):
-        for head_grp_name in current_dict.keys():
-            head_datas = current_dict[head_grp_name]
-            if isinstance(head_datas, dict):
-                self._update_head(data, head_datas, time_st, time_end)
+    def _head_values(self, data, time_st="", time_end="") -> Dict[Tuple[tuple, str], Any]:
+        """计算描述信息变量的值
+
+        Args:
+            data (Dict): 首条数据, 用于填充配置了key的描述信息
+            time_st (str, optional): 观测开始时间. Defaults to "".
+            time_end (str, optional): 观测结束时间. Defaults to "".
+
+        Returns:
+            Dict[Tuple[tuple, str], Any]: (组路径, nc变量名)到值的映射, 不同组中可以有同名变量
+        """
+        values = {}
+        for var in self.head:
+            key = (var.group, var.name)
+            if var.key is not None:
+                values[key] = data[var.key]
+            elif time_st and var.name == "Obse_begi_DT":
+                values[key] = time_st
+            elif time_end and var.name == "Obse_end_DT":
+                values[key] = time_end
+            elif var.name == "Data_crea_DT":
+                values[key] = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
             else:
-                for i in range(len(head_datas)):
-                    head_var = current_dict[head_grp_name][i]
-                    if head_var.key is not None:
-                        current_dict[head_grp_name][i].value = data[head_var.key]
-                    elif time_st and head_var.name == "Obse_begi_DT":
-                        current_dict[head_grp_name][i].value = time_st
-                    elif time_end and head_var.name == "Obse_end_DT":
-                        current_dict[head_grp_name][i].value = time_end
-                    elif head_var.name == "Data_crea_DT":
-                        current_dict[head_grp_name][i].value = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-    
-    def _create_var(self, nc_obj: nc._netCDF4, data_info, datas, accumulate_desc=False):
-        for grp_name, grp_data in data_info.items():
-            if len(grp_data) == 0:                                      # 跳过空的组
-                continue
-            grp_obj = nc_obj.createGroup(grp_name)
-            if isinstance(grp_data, dict):
-                self._create_var(grp_obj, grp_data, datas, accumulate_desc)
+                values[key] = var.value
+        return values
+
+    def _assemble_columns(self, datas: Union[List, RecordBatch]) -> Dict[str, np.ndarray]:
+        """列式组装观测要素: 按unique_dims预分配各变量的numpy缓冲区, 仅遍历一次datas完成填充;
+        RecordBatch直接使用其列数组, 类型一致时不复制数据
+
+        Args:
+            datas (List / RecordBatch): 数据字典列表(每个元素为一个时次的数据)或列式数据批
+
+        Returns:
+            Dict[Tuple[tuple, str], np.ndarray]: (组路径, nc变量名)到数据数组的映射, 第一维为数据条数
+        """
+        if isinstance(datas, RecordBatch):
+            return {(var.group, var.name): np.asarray(datas.column(var.key), dtype=object if var.nc_typ == NcType.string else var.nc_typ)
+                    for var in self.observation}
+        n = len(datas)
+        columns = {}
+        fills = []                                                      # (数据键, 缓冲区)
+        for var in self.observation:
+            dtype = object if var.nc_typ == NcType.string else var.nc_typ
+            buf = columns[(var.group, var.name)] = np.empty((n, ) + var.shape[1:], dtype=dtype)
+            fills.append((var.key, buf))
+        for i, d in enumerate(datas):
+            for key, buf in fills:
+                buf[i] = d[key]
+        return columns
+
+    def _define_vars(self, nc_obj: nc._netCDF4) -> Dict[Tuple[tuple, str], nc.Variable]:
+        """按写入计划创建nc组及变量(不写入数据)
+
+        Args:
+            nc_obj (nc._netCDF4): nc文件对象
+
+        Returns:
+            Dict[Tuple[tuple, str], nc.Variable]: (组路径, nc变量名)到变量对象的映射, 不同组中可以有同名变量
+        """
+        grp_objs = {(): nc_obj}
+        for grp_path in self.plan.groups:                           # 父组先于子组创建
+            grp_objs[grp_path] = grp_objs[grp_path[:-1]].createGroup(grp_path[-1])
+        nc_vars = {}
+        for var in self.head + self.observation:
+            nc_var = grp_objs[var.group].createVariable(var.name, var.nc_typ, var.dim, **dict(var.create_kwargs))
+            nc_var.long_name = var.longname
+            nc_var.units = var.units
+            nc_vars[(var.group, var.name)] = nc_var
+        return nc_vars
+
+    def _write_head(self, nc_vars: Dict[Tuple[tuple, str], nc.Variable], values: Dict[Tuple[tuple, str], Any]):
+        """写入描述信息变量的值"""
+        for var in self.head:
+            key = (var.group, var.name)
+            nc_vars[key][:] = np.array(values[key], dtype=var.nc_typ)
+
+    def _write_columns(self, nc_vars: Dict[Tuple[tuple, str], nc.Variable], columns: Dict[Tuple[tuple, str], np.ndarray], offset: int=0):
+        """将列式组装的观测数据沿第一维(Datetime)从offset处追加写入"""
+        for (group, name), buf in columns.items():
+            with timer('variable_write', var="/".join(group + (name, ))):   # 压缩大多在close时进行
+                nc_vars[(group, name)][offset: offset + len(buf)] = buf
+
+    def _lookup_vars(self, nc_obj: nc._netCDF4) -> Dict[Tuple[tuple, str], nc.Variable]:
+        """按写入计划获取已存在nc文件中的变量对象"""
+        nc_vars = {}
+        for var in self.head + self.observation:
+            grp_obj = nc_obj
+            for grp_name in var.group:
+                grp_obj = grp_obj.groups[grp_name]
+            nc_vars[(var.group, var.name)] = grp_obj.variables[var.name]
+        return nc_vars
+
+    @staticmethod
+    def _iter_batches(datas: Union[Iterable, RecordBatch], batch_size: int) -> Iterator[Union[List, RecordBatch]]:
+        """将数据按batch_size分批: 数据字典组成列表, RecordBatch按记录切片(不复制数据)"""
+        if isinstance(datas, RecordBatch):
+            datas = (datas, )
+        buf = []
+        for item in datas:
+            if isinstance(item, RecordBatch):
+                if buf:
+                    yield buf
+                    buf = []
+                for st in range(0, len(item), batch_size):
+                    yield item.slice(st, st + batch_size)
             else:
-                for info in grp_data:
-                    if info.nc_typ != NcType.string:                    # 非字符类型nc变量压缩
-                        var = grp_obj.createVariable(info.name, info.nc_typ, info.dim, compression="zlib")
-                    else:
-                        var = grp_obj.createVariable(info.name, info.nc_typ, info.dim)
-                    if not accumulate_desc:                             # 不进行数据叠加
-                        val = np.array(info.value, dtype=info.nc_typ)
-                    else:                                               # 默认固定值(未设置对应数据的key) 或数据叠加
-                        val = np.array([info.value for _ in datas], dtype=info.nc_typ) if info.key is None else \
-                            np.array([d[info.key] for d in datas], dtype=info.nc_typ)
-                    var[:] = val                                        # 数据存储
-                    var.long_name = info.longname
-                    var.units = info.units
-                    
-    def gerneral_nc(self, nc_path, datas: List):
-        if datas[0].get('Datetime', None) is not None:
-            logger.info(f"generate nc file: {datas[0]['Datetime']} ~ {datas[-1]['Datetime']}")
-        time_st = datas[0].get('Datetime', '')
-        time_ed = datas[-1].get('Datetime', '')
-        self._update_head(datas[0], self.head, time_st, time_ed)    # 更新描述信息值
+                buf.append(item)
+                if len(buf) >= batch_size:
+                    yield buf
+                    buf = []
+        if buf:
+            yield buf
+
+    @staticmethod
+    def _record(batch: Union[List, RecordBatch], i: int) -> Dict[str, Any]:
+        """获取批数据中第i条记录的字典形式"""
+        return batch.record(i) if isinstance(batch, RecordBatch) else batch[i]
+
+    def _write_batches(self, nc_vars: Dict[Tuple[tuple, str], nc.Variable], batches: Iterable, offset: int=0) -> int:
+        """从offset处开始逐批写入观测要素, 写完后更新Obse_end_DT, 返回写入的条数"""
+        count = 0
+        for batch in batches:
+            with timer('column_assembly'):
+                columns = self._assemble_columns(batch)
+            self._write_columns(nc_vars, columns, offset + count)
+            count += len(batch)
+            incr('records_written', len(batch))
+            time_ed = self._record(batch, -1).get('Datetime', '')
+        if time_ed:                                                 # 结束时间在写完所有数据后确定
+            for var in self.head:
+                if var.name == "Obse_end_DT":
+                    nc_vars[(var.group, var.name)][:] = np.array(time_ed, dtype=NcType.string)
+        return count
+
+    def gerneral_nc(self, nc_path, datas: Union[List, RecordBatch], profile: Union[str, bool]=None) -> int:
+        """一次性生成nc文件, 数据需全部在内存中
+
+        Args:
+            nc_path (str): 生成的nc文件路径
+            datas (List / RecordBatch): 数据字典列表或列式数据批
+            profile (str / bool, optional): 性能分析模式'cpu'/'memory'/'all', 结果保存在nc文件旁,
+                为None时读取环境变量DATASET_PROFILE, 见log.profiling. Defaults to None.
+
+        Returns:
+            int: 写入的数据条数, 没有数据时不生成文件并返回0
+        """
+        if len(datas) == 0:
+            logger.warning(f"no data to generate nc file {nc_path}, skip.")
+            return 0
+        time_st = self._record(datas, 0).get('Datetime', None)
+        if time_st is not None:
+            logger.info(f"generate nc file: {time_st} ~ {self._record(datas, -1)['Datetime']}")
+        with profiled(nc_path, profile):
+            return self.gerneral_nc_stream(nc_path, datas, batch_size=len(datas))
+
+    def gerneral_nc_stream(self, nc_path, datas: Iterable, batch_size: int=1000) -> int:
+        """流式生成nc文件: 只打开一次文件, 按batch_size分批消费数据迭代器(列表或mongo游标等),
+        沿不限长维度Datetime追加写入, 关闭前更新Obse_end_DT, 内存占用与数据总量无关
+
+        Args:
+            nc_path (str): 生成的nc文件路径
+            datas (Iterable / RecordBatch): 数据字典的可迭代对象, 或RecordBatch及其可迭代对象
+            batch_size (int, optional): 每批写入的数据条数. Defaults to 1000.
+
+        Raises:
+            NoDataError: 没有可写入的数据
+
+        Returns:
+            int: 写入的数据条数
+        """
+        batches = self._first_batch(datas, batch_size, nc_path)
         output_dir, _ = os.path.split(nc_path)
-        if output_dir and not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-        nc_obj = nc.Dataset(nc_path, "w", "NETCDF4")
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        tmp_path = f"{nc_path}.tmp"                                 # 先写入临时文件, 完成后再重命名, 避免留下不完整的文件
+        nc_obj = nc.Dataset(tmp_path, "w", "NETCDF4")
+        try:
+            count = self._write_dataset(nc_obj, batches)
+            with timer('close'):
+                nc_obj.close()                                      # 关闭文件
+        except BaseException:
+            if nc_obj.isopen():
+                nc_obj.close()
+            os.remove(tmp_path)
+            raise
+        os.replace(tmp_path, nc_path)
+        incr('bytes_written', os.path.getsize(nc_path))
+        logger.info(f"has generated nc file {nc_path}, {count} records.")
+        return count
+
+    def gerneral_nc_memory(self, datas: Iterable, batch_size: int=1000, initial_size: int=1 << 20) -> Tuple[memoryview, int]:
+        """在内存中生成nc文件(netCDF4 memory模式), 不产生磁盘文件, 可直接上传到GridFS等
+
+        Args:
+            datas (Iterable / RecordBatch): 数据字典的可迭代对象, 或RecordBatch及其可迭代对象
+            batch_size (int, optional): 每批写入的数据条数. Defaults to 1000.
+            initial_size (int, optional): 内存文件的初始大小(字节), 不足时自动增长. Defaults to 1 << 20.
+
+        Raises:
+            NoDataError: 没有可写入的数据
+
+        Returns:
+            Tuple[memoryview, int]: nc文件的完整内容及写入的数据条数
+        """
+        batches = self._first_batch(datas, batch_size, "memory")
+        nc_obj = nc.Dataset("memory.nc", "w", "NETCDF4", memory=initial_size)
+        try:
+            count = self._write_dataset(nc_obj, batches)
+        except BaseException:
+            nc_obj.close()
+            raise
+        with timer('close'):
+            buffer = nc_obj.close()
+        incr('bytes_written', len(buffer))
+        return buffer, count
+
+    def _first_batch(self, datas: Iterable, batch_size: int, target: str) -> Iterator[Union[List, RecordBatch]]:
+        """分批并检查是否有数据, 返回包含第一批在内的批迭代器"""
+        batches = self._iter_batches(datas, batch_size)
+        batch = next(batches, None)
+        if batch is None:
+            raise NoDataError(f"no data to generate nc file {target}")
+        return chain((batch, ), batches)
+
+    def _write_dataset(self, nc_obj: nc._netCDF4, batches: Iterator[Union[List, RecordBatch]]) -> int:
+        """在新建的nc对象中生成维度、变量及描述信息并写入全部数据, 返回写入的条数"""
+        batch = next(batches)
+        first = self._record(batch, 0)
+        with timer('head_update'):
+            head_values = self._head_values(first, first.get('Datetime', ''))     # 计算描述信息值
         self._generate_dimension(nc_obj)                            # 生成维度信息
-        self._create_var(nc_obj, self.head, datas, accumulate_desc=False)
-        self._create_var(nc_obj, self.observation, datas, accumulate_desc=True)
-        nc_obj.close()                                          # 关闭文件
-        logger.info(f"has generated nc file {nc_path}")
+        nc_vars = self._define_vars(nc_obj)
+        self._write_head(nc_vars, head_values)
+        return self._write_batches(nc_vars, chain((batch, ), batches))
+
+    def append_nc_stream(self, nc_path, datas: Iterable, offset: int=None, batch_size: int=1000) -> int:
+        """向已存在的nc文件沿不限长维度Datetime追加数据并更新Obse_end_DT, 文件不存在时新建
+
+        Args:
+            nc_path (str): nc文件路径
+            datas (Iterable / RecordBatch): 数据字典的可迭代对象, 或RecordBatch及其可迭代对象
+            offset (int, optional): 开始写入的位置, 为None时追加到文件末尾;
+                传入上次成功写入后的记录数可覆盖中断时写入的不完整数据. 不限长维度无法缩短,
+                覆盖写入的数据少于原有的尾部时, offset + 写入条数之后的旧数据仍保留在文件中(记录警告日志). Defaults to None.
+            batch_size (int, optional): 每批写入的数据条数. Defaults to 1000.
+
+        Raises:
+            ValueError: offset大于文件中已有的记录数(会留下未写入的空洞)
+
+        Returns:
+            int: 写入的数据条数
+        """
+        if not os.path.exists(nc_path):
+            return self.gerneral_nc_stream(nc_path, datas, batch_size=batch_size)
+        batches = self._iter_batches(datas, batch_size)
+        batch = next(batches, None)
+        if batch is None:
+            return 0
+        nc_obj = nc.Dataset(nc_path, "a")
+        try:
+            nc_vars = self._lookup_vars(nc_obj)
+            first = self.observation[0]
+            length = nc_vars[(first.group, first.name)].shape[0]
+            if offset is None:
+                offset = length
+            elif offset > length:
+                raise ValueError(f"offset {offset} is beyond the {length} records in nc file {nc_path}.")
+            count = self._write_batches(nc_vars, chain((batch, ), batches), offset)
+        finally:
+            with timer('close'):
+                nc_obj.close()
+        if offset + count < length:
+            logger.warning(f"{length - offset - count} stale records remain after record {offset + count} in nc file {nc_path}.")
+        logger.info(f"has appended {count} records to nc file {nc_path}.")
+        return count
 
     def __repr__(self) -> str:
         return pformat({"head": self.head, 
                         "observation": self.observation, 
                         "nc2data": self.nc2data,
                         "unique_dims": self.unique_dims,
-                        "name": self.name})
\ No newline at end of file
+                        "name": self.name,
+                        "fingerprint": self.plan.fingerprint})
\ No newline at end of file
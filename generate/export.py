@@ -0,0 +1,145 @@
+import os
+from datetime import datetime, timedelta
+from logging import getLogger
+from typing import Iterator, List, Optional, Tuple, Union
+
+from .batch import JobResult, NcJob, generate_many
+from .core import NcGenerator
+from .plan import NcPlan
+
+
+logger = getLogger(os.path.basename(__file__))
+
+WINDOWS = {
+    'hourly': timedelta(hours=1),
+    'daily': timedelta(days=1),
+}
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"           # 数据库中Datetime字段的格式
+
+
+def _window_step(window: Union[str, timedelta]) -> timedelta:
+    if isinstance(window, timedelta):
+        return window
+    if window not in WINDOWS:
+        raise ValueError(f"unknown window {window}, please choose in {list(WINDOWS.keys())} or use a timedelta.")
+    return WINDOWS[window]
+
+
+def to_datetime(value: Union[str, datetime]) -> datetime:
+    """将数据中的时间(datetime或TIME_FORMAT格式的字符串, 可带毫秒)转换为datetime"""
+    if isinstance(value, datetime):
+        return value
+    return datetime.strptime(value[:19], TIME_FORMAT)
+
+
+def window_start(dt: datetime, window: Union[str, timedelta]='daily') -> datetime:
+    """将时间向下对齐到窗口长度的整数倍(整点/整日)"""
+    step = _window_step(window)
+    return datetime.min + (dt - datetime.min) // step * step
+
+
+def iter_windows(start: datetime, end: datetime, window: Union[str, timedelta]='daily') -> Iterator[Tuple[datetime, datetime]]:
+    """将[start, end)按窗口长度切分, 窗口起点向下对齐到窗口长度的整数倍(整点/整日)
+
+    Args:
+        start (datetime): 开始时间
+        end (datetime): 结束时间(不含)
+        window (str / timedelta, optional): 窗口长度, 'hourly'/'daily'或timedelta. Defaults to 'daily'.
+
+    Yields:
+        Tuple[datetime, datetime]: 窗口的起止时间(不含结束时间)
+    """
+    step = _window_step(window)
+    st = window_start(start, step)
+    while st < end:
+        yield st, st + step
+        st += step
+
+
+def plan_export_jobs(generator: NcGenerator,
+                     coll_name: str,
+                     output_dir: str,
+                     stations: List[str],
+                     start: datetime,
+                     end: datetime,
+                     window: Union[str, timedelta]='daily',
+                     station_field: str='station_id',
+                     time_field: str='Datetime',
+                     overwrite: bool=False,
+                     hint: Optional[list]=None) -> List[NcJob]:
+    """按站点及时间窗口生成导出任务, 每个任务为一次按站点和时间范围排序的查询, 已存在的输出文件默认跳过,
+    hint为查询强制使用的索引
+
+    Returns:
+        List[NcJob]: 导出任务列表
+    """
+    if generator.name is None:
+        raise ValueError("the 'name' item must be configured to export files.")
+    jobs = []
+    skipped = 0
+    for station in stations:
+        for st, ed in iter_windows(start, end, window):
+            nc_path = os.path.join(output_dir, str(station), generator.generate_fileanme(st, station_code=str(station)))
+            if not overwrite and os.path.exists(nc_path):
+                skipped += 1
+                continue
+            sql = {station_field: station, time_field: {"$gte": st.strftime(TIME_FORMAT), "$lt": ed.strftime(TIME_FORMAT)}}
+            jobs.append(NcJob(nc_path, coll_name=coll_name, sql=sql, sortby=time_field, hint=hint))
+    if skipped:
+        logger.info(f"skip {skipped} windows whose nc file already exists.")
+    return jobs
+
+
+def export_collection(nc_config: Union[dict, NcPlan],
+                      coll_name: str,
+                      output_dir: str,
+                      start: datetime,
+                      end: datetime,
+                      window: Union[str, timedelta]='daily',
+                      station_field: str='station_id',
+                      stations: Optional[List[str]]=None,
+                      time_field: str='Datetime',
+                      overwrite: bool=False,
+                      num_workers: int=4,
+                      batch_size: int=1000,
+                      db_client=None,
+                      ensure_index: bool=True) -> List[JobResult]:
+    """将mongo集合按站点及时间窗口导出为nc文件, 各窗口及站点并行生成
+
+    Args:
+        nc_config (Dict / NcPlan): 生成配置字典或已编译的写入计划
+        coll_name (str): 集合名
+        output_dir (str): 输出目录, 文件保存在 output_dir/站点/ 下
+        start (datetime): 开始时间
+        end (datetime): 结束时间(不含)
+        window (str / timedelta, optional): 窗口长度, 'hourly'/'daily'或timedelta. Defaults to 'daily'.
+        station_field (str, optional): 站点字段名. Defaults to 'station_id'.
+        stations (List[str], optional): 导出的站点, 为None时导出集合中的所有站点. Defaults to None.
+        time_field (str, optional): 时间字段名. Defaults to 'Datetime'.
+        overwrite (bool, optional): 是否覆盖已存在的文件. Defaults to False.
+        num_workers (int, optional): 工作进程数. Defaults to 4.
+        batch_size (int, optional): 每批写入的数据条数. Defaults to 1000.
+        db_client (MyMongodb, optional): 用于查询站点列表及建立索引的数据库对象, 为None时新建. Defaults to None.
+        ensure_index (bool, optional): 是否确保存在(站点, 时间)复合索引并在查询时强制使用,
+            同时检查查询计划, 退化为全集合扫描时记录警告. Defaults to True.
+
+    Returns:
+        List[JobResult]: 各任务的执行结果
+    """
+    generator = NcGenerator(nc_config)
+    if db_client is None and (stations is None or ensure_index):
+        from dbcontroller import get_mongo_cilent
+        db_client = get_mongo_cilent()
+    if stations is None:
+        stations = sorted(db_client.get_field_distinct(coll_name, station_field))
+    hint = None
+    if ensure_index:
+        hint = [(station_field, 1), (time_field, 1)]
+        db_client.ensure_index(coll_name, hint)
+    jobs = plan_export_jobs(generator, coll_name, output_dir, stations, start, end, window,
+                            station_field=station_field, time_field=time_field, overwrite=overwrite, hint=hint)
+    if len(jobs) == 0:
+        return []
+    if ensure_index:                                    # 各任务的查询形式相同, 只检查第一个
+        db_client.check_query(coll_name, jobs[0].sql, jobs[0].sortby, hint)
+    return generate_many(generator.plan, jobs, num_workers=num_workers, batch_size=batch_size)
@@ -0,0 +1,132 @@
+import json
+import os
+from datetime import timedelta
+from itertools import groupby
+from logging import getLogger
+from typing import Dict, List, Optional, Union
+
+from .core import NcGenerator
+from .export import to_datetime, window_start
+from .plan import NcPlan
+from .prefetch import prefetch_docs
+
+
+logger = getLogger(os.path.basename(__file__))
+
+
+class JsonWatermarkStore:
+    def __init__(self, state_file: str) -> None:
+        """以本地json文件保存各(集合, 站点)的导出水位线, 每次更新都以原子替换的方式落盘
+
+        Args:
+            state_file (str): 状态文件路径
+        """
+        self.state_file = state_file
+        self.states = {}
+        if os.path.exists(state_file):
+            with open(state_file, "r", encoding='utf8') as fp:
+                self.states = json.load(fp)
+
+    def get(self, coll_name: str, station: str) -> Optional[Dict]:
+        return self.states.get(f"{coll_name}/{station}")
+
+    def set(self, coll_name: str, station: str, state: Dict):
+        self.states[f"{coll_name}/{station}"] = state
+        tmp_file = f"{self.state_file}.tmp"
+        with open(tmp_file, "w", encoding='utf8') as fp:
+            json.dump(self.states, fp, indent=4, ensure_ascii=False)
+        os.replace(tmp_file, self.state_file)
+
+
+class MongoWatermarkStore:
+    def __init__(self, db_client, coll_name: str='export_watermark') -> None:
+        """以mongo集合保存各(集合, 站点)的导出水位线
+
+        Args:
+            db_client (MyMongodb): 数据库对象
+            coll_name (str, optional): 保存水位线的集合名. Defaults to 'export_watermark'.
+        """
+        self.db_client = db_client
+        self.coll_name = coll_name
+
+    def get(self, coll_name: str, station: str) -> Optional[Dict]:
+        docs = list(self.db_client.get_docs(self.coll_name, sql={"coll": coll_name, "station": station}, limit=1))
+        if len(docs) == 0:
+            return None
+        return {k: v for k, v in docs[0].items() if k not in ("_id", "coll", "station")}
+
+    def set(self, coll_name: str, station: str, state: Dict):
+        fit = {"coll": coll_name, "station": station}
+        if not self.db_client.update_one(self.coll_name, fit, state) and self.get(coll_name, station) is None:
+            self.db_client.save_docs(dict(fit, **state), self.coll_name)
+
+
+class _Tracker:
+    """遍历数据的同时记录最后一条数据的时间"""
+    def __init__(self, datas, time_field: str) -> None:
+        self.datas = datas
+        self.time_field = time_field
+        self.last = None
+
+    def __iter__(self):
+        for d in self.datas:
+            self.last = d[self.time_field]
+            yield d
+
+
+def export_incremental(nc_config: Union[dict, NcPlan],
+                       coll_name: str,
+                       output_dir: str,
+                       stations: List[str],
+                       store: Union[JsonWatermarkStore, MongoWatermarkStore],
+                       db_client,
+                       window: Union[str, timedelta]='daily',
+                       station_field: str='station_id',
+                       time_field: str='Datetime',
+                       batch_size: int=1000) -> Dict[str, int]:
+    """增量导出: 按各站点的水位线只查询新数据, 追加到当前窗口的nc文件中, 跨窗口时滚动到新文件,
+    每个窗口写完后更新水位线, 中断后重新运行可从上次成功的位置继续
+
+    水位线内容为 {"last": 最后导出数据的时间, "nc_path": 当前nc文件, "count": 当前nc文件中已成功写入的记录数}
+
+    Args:
+        nc_config (Dict / NcPlan): 生成配置字典或已编译的写入计划
+        coll_name (str): 集合名
+        output_dir (str): 输出目录, 文件保存在 output_dir/站点/ 下
+        stations (List[str]): 导出的站点
+        store (JsonWatermarkStore / MongoWatermarkStore): 水位线存储
+        db_client (MyMongodb): 数据库对象
+        window (str / timedelta, optional): 文件的时间窗口长度. Defaults to 'daily'.
+        station_field (str, optional): 站点字段名. Defaults to 'station_id'.
+        time_field (str, optional): 时间字段名. Defaults to 'Datetime'.
+        batch_size (int, optional): 每批写入的数据条数. Defaults to 1000.
+
+    Returns:
+        Dict[str, int]: 各站点新导出的记录数
+    """
+    generator = NcGenerator(nc_config)
+    if generator.name is None:
+        raise ValueError("the 'name' item must be configured to export files.")
+    exported = {}
+    for station in stations:
+        state = store.get(coll_name, station)
+        sql = {station_field: station}
+        if state is not None:
+            sql[time_field] = {"$gt": state["last"]}
+        cursor = prefetch_docs(db_client, coll_name, generator, sql=sql, sortby=time_field, batch_size=batch_size, extra_keys=(time_field, ))
+        exported[station] = 0
+        # 数据按时间排序, 按所属窗口分组后依次写入对应的文件
+        for win_st, group in groupby(cursor, key=lambda d: window_start(to_datetime(d[time_field]), window)):
+            nc_path = os.path.join(output_dir, str(station), generator.generate_fileanme(win_st, station_code=str(station)))
+            tracker = _Tracker(group, time_field)
+            if state is not None and state["nc_path"] == nc_path:   # 追加到当前文件
+                written = generator.append_nc_stream(nc_path, tracker, offset=state["count"], batch_size=batch_size)
+                count = state["count"] + written
+            else:                                                   # 滚动到新文件
+                written = count = generator.gerneral_nc_stream(nc_path, tracker, batch_size=batch_size)
+            exported[station] += written
+            state = {"last": tracker.last, "nc_path": nc_path, "count": count}
+            store.set(coll_name, station, state)
+        logger.info(f"{exported[station]} new records of station {station} in {coll_name} are exported.")
+    return exported
+
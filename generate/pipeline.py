@@ -0,0 +1,207 @@
+import os
+import pickle
+import shutil
+import tempfile
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from logging import getLogger
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from .batch import JobResult, NcJob, generate_many
+from .columnar import RecordBatch
+from .core import NcGenerator
+from .export import to_datetime, window_start
+from .plan import NcPlan
+
+
+logger = getLogger(os.path.basename(__file__))
+
+MAX_BUFFERED = 50000                    # 主进程中最多缓存的记录数, 超出时将所有组的缓存写入溢写文件
+
+
+@dataclass
+class SpillFile:
+    """同一nc文件的解析结果的溢写文件(分块pickle), 遍历时读回并按时间排序;
+    传递到工作进程时只传递路径, 内存占用为单个文件(站点及时间窗口)的数据量"""
+    path: str
+    time_field: str = 'Datetime'
+
+    def append(self, items: list):
+        """将一块数据追加写入文件"""
+        with open(self.path, "ab") as fp:
+            pickle.dump(items, fp, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def load(self) -> list:
+        """读回全部数据块"""
+        items = []
+        with open(self.path, "rb") as fp:
+            while True:
+                try:
+                    items.extend(pickle.load(fp))
+                except EOFError:
+                    return items
+
+    def __iter__(self):
+        items = self.load()
+        if len(items) == 0:
+            return
+        group = _sort_group(items, self.time_field)
+        if isinstance(group, RecordBatch):
+            yield group
+        else:
+            yield from group
+
+
+class _GroupSpiller:
+    def __init__(self, spill_dir: str, time_field: str, batch_size: int, max_buffered: int) -> None:
+        """按(站点, 窗口起点)缓存解析结果, 单组缓存达到batch_size条或总缓存达到max_buffered条时追加写入溢写文件"""
+        self.spill_dir = spill_dir
+        self.time_field = time_field
+        self.batch_size = batch_size
+        self.max_buffered = max_buffered
+        self.spills: Dict[Tuple[str, datetime], SpillFile] = {}
+        self._buffers = defaultdict(list)
+        self._sizes = defaultdict(int)
+        self._buffered = 0
+
+    def add(self, key: Tuple[str, datetime], item: Union[dict, RecordBatch]):
+        size = len(item) if isinstance(item, RecordBatch) else 1
+        self._buffers[key].append(item)
+        self._sizes[key] += size
+        self._buffered += size
+        if self._sizes[key] >= self.batch_size:
+            self.flush(key)
+        elif self._buffered >= self.max_buffered:
+            self.flush_all()
+
+    def flush(self, key: Tuple[str, datetime]):
+        items = self._buffers.pop(key, None)
+        if not items:
+            return
+        spill = self.spills.get(key)
+        if spill is None:
+            spill = self.spills[key] = SpillFile(os.path.join(self.spill_dir, f"{len(self.spills)}.pkl"), self.time_field)
+        spill.append(items)
+        self._buffered -= self._sizes.pop(key)
+
+    def flush_all(self):
+        for key in list(self._buffers.keys()):
+            self.flush(key)
+
+
+def parse_to_nc(nc_config: Union[dict, NcPlan],
+                processor,
+                file_paths: Iterable[str],
+                output_dir: str,
+                window: Union[str, timedelta]='daily',
+                station_field: str='station_id',
+                time_field: str='Datetime',
+                overwrite: bool=False,
+                batch_size: int=1000,
+                db_client=None,
+                coll_name: str=None,
+                num_workers: int=4,
+                spill_dir: Optional[str]=None,
+                max_buffered: int=MAX_BUFFERED) -> List[JobResult]:
+    """解析原始文件并直接生成nc文件, 不经过mongo数据库的存取;
+    解析结果按站点及时间窗口分组, 边解析边分块溢写到本地临时文件, 主进程内存占用与数据总量无关;
+    解析完成后各组由generate_many在进程池中并行排序并写入, 可选地在后台线程中同时存入mongo
+
+    Args:
+        nc_config (Dict / NcPlan): 生成配置字典或已编译的写入计划
+        processor (FileProcessor): 文件处理器, 并行解析文件
+        file_paths (Iterable[str]): 要解析的文件
+        output_dir (str): 输出目录, 文件保存在 output_dir/站点/ 下
+        window (str / timedelta, optional): 文件的时间窗口长度. Defaults to 'daily'.
+        station_field (str, optional): 站点字段名. Defaults to 'station_id'.
+        time_field (str, optional): 时间字段名. Defaults to 'Datetime'.
+        overwrite (bool, optional): 是否覆盖已存在的文件. Defaults to False.
+        batch_size (int, optional): 每批写入nc文件及数据库的数据条数. Defaults to 1000.
+        db_client (MyMongodb, optional): 同时存入的数据库对象, 为None时不存入数据库. Defaults to None.
+        coll_name (str, optional): 同时存入的集合名. Defaults to None.
+        num_workers (int, optional): 生成nc文件的工作进程数. Defaults to 4.
+        spill_dir (str, optional): 溢写临时目录的父目录, 为None时使用系统临时目录. Defaults to None.
+        max_buffered (int, optional): 主进程中最多缓存的记录数. Defaults to MAX_BUFFERED.
+
+    Returns:
+        List[JobResult]: 各nc文件的生成结果
+    """
+    generator = NcGenerator(nc_config)
+    if generator.name is None:
+        raise ValueError("the 'name' item must be configured to export files.")
+    if db_client is not None and not coll_name:
+        raise ValueError("coll_name must be given to save records into the database.")
+    saver = ThreadPoolExecutor(max_workers=1) if db_client is not None else None
+    saving = []
+    nc_paths: Dict[Tuple[str, datetime], Optional[str]] = {}      # (站点, 窗口起点) -> nc文件路径, 跳过时为None
+    tmp_dir = tempfile.mkdtemp(prefix="parse_to_nc_", dir=spill_dir)
+    spiller = _GroupSpiller(tmp_dir, time_field, batch_size, max_buffered)
+    try:
+        pending = []
+        for item in processor.iter_files(file_paths):
+            if isinstance(item, RecordBatch):
+                parts = _split_batch(item, window, station_field, time_field)
+                if saver is not None:
+                    saving.append(saver.submit(db_client.save_docs, item, coll_name))
+            else:
+                parts = [((str(item[station_field]), window_start(to_datetime(item[time_field]), window)), item)]
+                if saver is not None:
+                    pending.append(item)
+                    if len(pending) >= batch_size:
+                        saving.append(saver.submit(db_client.save_docs, pending, coll_name))
+                        pending = []
+            for key, part in parts:
+                if key not in nc_paths:
+                    nc_paths[key] = _nc_path(generator, output_dir, key, overwrite)
+                if nc_paths[key] is not None:
+                    spiller.add(key, part)
+        if saver is not None and pending:
+            saving.append(saver.submit(db_client.save_docs, pending, coll_name))
+        spiller.flush_all()
+        jobs = [NcJob(nc_paths[key], datas=spill) for key, spill in sorted(spiller.spills.items())]
+        results = generate_many(generator.plan, jobs, num_workers=num_workers, batch_size=batch_size)
+    finally:
+        if saver is not None:
+            saver.shutdown(wait=True)                   # 等待数据库写入完成
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    errors = [future.exception() for future in saving if future.exception() is not None]
+    for exc in errors:
+        logger.error(f"failed to save records into {coll_name}: {type(exc).__name__}: {exc}")
+    if errors:
+        raise errors[0]
+    return results
+
+
+def _nc_path(generator: NcGenerator, output_dir: str, key: Tuple[str, datetime], overwrite: bool) -> Optional[str]:
+    station, win_st = key
+    nc_path = os.path.join(output_dir, station, generator.generate_fileanme(win_st, station_code=station))
+    if not overwrite and os.path.exists(nc_path):
+        logger.info(f"skip {nc_path}, file already exists.")
+        return None
+    return nc_path
+
+
+def _split_batch(batch: RecordBatch, window, station_field: str, time_field: str) -> Iterator[tuple]:
+    """按(站点, 窗口起点)拆分列式数据批"""
+    indices = defaultdict(list)
+    for i, (station, t) in enumerate(zip(batch.column(station_field), batch.column(time_field))):
+        indices[(str(station), window_start(to_datetime(t), window))].append(i)
+    for key, idx in indices.items():
+        yield key, batch.take(np.array(idx))
+
+
+def _sort_group(items: list, time_field: str):
+    """将同一文件的数据按时间排序, 含列式数据批时合并为一个数据批"""
+    if all(isinstance(item, dict) for item in items):
+        return sorted(items, key=lambda d: to_datetime(d[time_field]))
+    docs = [item for item in items if isinstance(item, dict)]
+    batches = [item for item in items if isinstance(item, RecordBatch)]
+    if docs:
+        batches.insert(0, RecordBatch.from_docs(docs))
+    batch = RecordBatch.concat(batches)
+    order = np.argsort([to_datetime(t) for t in batch.column(time_field)], kind='stable')
+    return batch.take(order)
@@ -0,0 +1,215 @@
+import hashlib
+import math
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from .config.BaseType import NcDim, NcName, NcStorage, NcType, BaseHeadData, BaseObsData
+
+
+DEFAULT_CHUNK_BYTES = 1 << 20               # 自动分块时每块的目标字节数
+DEFAULT_CHUNK_RECORDS = 4096                # 自动分块时沿不限长维度的最大记录数
+# 压缩方式及netCDF-C库对其支持的标识, None表示始终支持
+COMPRESSIONS = {
+    'zlib': None,
+    'szip': '__has_szip_support__',
+    'zstd': '__has_zstandard_support__',
+    'bzip2': '__has_bzip2_support__',
+    'blosc_lz': '__has_blosc_support__',
+    'blosc_lz4': '__has_blosc_support__',
+    'blosc_lz4hc': '__has_blosc_support__',
+    'blosc_zlib': '__has_blosc_support__',
+    'blosc_zstd': '__has_blosc_support__',
+}
+
+
+@dataclass(frozen=True)
+class VarPlan:
+    """单个nc变量的写入计划"""
+    group: Tuple[str, ...]                  # 变量所在组的路径
+    key: Optional[str]                      # 传入数据中对应的键值, 无对应数据时为None
+    name: str                               # nc变量名
+    nc_typ: str                             # nc变量类型
+    dim: Tuple[str, ...]                    # nc变量维度名
+    shape: Tuple[Optional[int], ...]        # 各维度大小, 不限长维度为None
+    longname: str                           # nc变量longname属性
+    units: str                              # nc变量units属性
+    value: Any                              # 描述信息的默认值, 观测要素为None
+    create_kwargs: Tuple[Tuple[str, Any], ...]  # createVariable的额外参数(压缩等)
+
+
+@dataclass(frozen=True)
+class NcPlan:
+    """编译后的nc文件写入计划"""
+    fingerprint: str                        # 配置指纹
+    name: Optional[NcName]                  # nc文件名配置
+    dims: Tuple[NcDim, ...]                 # 按首次出现顺序排列的唯一维度
+    groups: Tuple[Tuple[str, ...], ...]     # 需要创建的组路径, 父组在前
+    head: Tuple[VarPlan, ...]               # 描述信息变量
+    observation: Tuple[VarPlan, ...]        # 观测要素变量
+    nc2data: Tuple[Tuple[str, str], ...]    # nc变量到实际数据名的映射表
+    source_keys: Tuple[str, ...]            # 生成时需要从数据中读取的键
+
+
+PLAN_CACHE_SIZE = 64                        # 最多缓存的写入计划数, 超出时丢弃最久未使用的
+_PLAN_CACHE: 'OrderedDict[str, NcPlan]' = OrderedDict()
+
+
+def config_fingerprint(nc_config: dict, head_data_cls=BaseHeadData, observation_data_cls=BaseObsData) -> str:
+    """计算配置的指纹, 配置内容及数据类相同时指纹相同"""
+    classes = tuple(f"{c.__module__}.{c.__qualname__}" for c in (head_data_cls, observation_data_cls))
+    return hashlib.sha1(repr((classes, nc_config)).encode('utf8')).hexdigest()
+
+
+def compile_plan(nc_config: dict, head_data_cls=BaseHeadData, observation_data_cls=BaseObsData) -> NcPlan:
+    """编译nc生成配置为写入计划, 相同配置只编译一次(最多缓存PLAN_CACHE_SIZE个), 不会修改传入的配置
+
+    Args:
+        nc_config (Dict): 生成配置字典, 格式见NcGenerator
+        head_data_cls (optional): 描述信息数据类. Defaults to BaseHeadData.
+        observation_data_cls (optional): 观测要素数据类. Defaults to BaseObsData.
+
+    Returns:
+        NcPlan: 写入计划
+    """
+    fingerprint = config_fingerprint(nc_config, head_data_cls, observation_data_cls)
+    plan = _PLAN_CACHE.get(fingerprint)
+    if plan is None:
+        plan = _compile(nc_config, fingerprint, head_data_cls, observation_data_cls)
+        _PLAN_CACHE[fingerprint] = plan
+        while len(_PLAN_CACHE) > PLAN_CACHE_SIZE:
+            _PLAN_CACHE.popitem(last=False)
+    else:
+        _PLAN_CACHE.move_to_end(fingerprint)
+    return plan
+
+
+def _compile(nc_config: dict, fingerprint: str, head_data_cls, observation_data_cls) -> NcPlan:
+    config = dict(nc_config)
+    name = config.pop('name', None)
+    if name is not None:
+        name = NcName(*name)                                        # 生成的nc文件名
+    keys = list(config.keys())
+    if len(keys) == 0:
+        raise ValueError(f"There are no valid data items in the configuration:\n{nc_config}")
+    assert len(keys) == 2, f"Two items must be configured in:\n{nc_config}"
+    dims: Dict[str, NcDim] = {}
+    groups: List[Tuple[str, ...]] = []
+    head = _compile_groups({keys[0]: config[keys[0]]}, head_data_cls, (), dims, groups)              # 头部描述信息
+    observation = _compile_groups({keys[1]: config[keys[1]]}, observation_data_cls, (), dims, groups)  # 要素信息
+    nc2data = tuple((var.name, var.key) for var in head + observation if var.key is not None)
+    return NcPlan(fingerprint=fingerprint,
+                  name=name,
+                  dims=tuple(dims.values()),
+                  groups=tuple(groups),
+                  head=tuple(head),
+                  observation=tuple(observation),
+                  nc2data=nc2data,
+                  source_keys=tuple(dict.fromkeys(key for _, key in nc2data)))
+
+
+def _compile_groups(data: dict, DataClass, path: Tuple[str, ...], dims: Dict[str, NcDim], groups: List) -> List[VarPlan]:
+    res = []
+    for grp_name, grp_data in data.items():
+        grp_path = path + (grp_name, )
+        idx = len(groups)
+        groups.append(grp_path)
+        if isinstance(grp_data, dict):
+            grp_vars = _compile_groups(grp_data, DataClass, grp_path, dims, groups)
+        elif isinstance(grp_data, (list, tuple)):
+            rows = grp_data if isinstance(grp_data, list) else [grp_data]
+            grp_vars = [_compile_var(row, DataClass, grp_path, dims) for row in rows]
+        else:
+            raise ValueError(f"values of {grp_name} must be {DataClass}.")
+        if len(grp_vars) == 0:                                      # 跳过空的组
+            del groups[idx:]
+        res.extend(grp_vars)
+    return res
+
+
+def _parse_row(row: Union[tuple, list], DataClass):
+    """解析单行配置元组为数据类实例"""
+    if len(row) == 2 and isinstance(row[1], tuple):
+        if row[0] == '+':           # 实际变量名与生成nc文件名相同
+            return DataClass(row[1][0], *row[1])
+        elif row[0] == '-':         # 无实际变量名，仅使用默认值生成
+            if issubclass(DataClass, BaseHeadData):
+                return DataClass(None, *row[1])
+            elif issubclass(DataClass, BaseObsData):
+                raise ValueError(f"{DataClass} no support use '-' to omit data.")
+            else:
+                raise ValueError(f"unknown DataClass:{DataClass}")
+        else:
+            return DataClass(row[0], *row[1])
+    elif isinstance(row, tuple):    # 实际变量名与生成nc文件名相同
+        return DataClass(row[0], *row)
+    else:
+        raise ValueError(f"not support formate at {row}")
+
+
+def _compile_var(row, DataClass, grp_path: Tuple[str, ...], dims: Dict[str, NcDim]) -> VarPlan:
+    info = _parse_row(row, DataClass)
+    var_dims = []                   # 记录每个变量的实际的维度变量名,方便生成直接使用
+    for _dim in info.dim:           # 记录唯一维度信息
+        dim = NcDim(*_dim)
+        known = dims.setdefault(dim.name, dim)
+        if known.value != dim.value:
+            raise ValueError(f"dimension {dim.name} is defined with different sizes: {known.value} and {dim.value}")
+        var_dims.append(dim)
+    create_kwargs = _storage_kwargs(info, var_dims)
+    return VarPlan(group=grp_path,
+                   key=info.key,
+                   name=info.name,
+                   nc_typ=info.nc_typ,
+                   dim=tuple(d.name for d in var_dims),
+                   shape=tuple(d.value for d in var_dims),
+                   longname=info.longname,
+                   units=info.units,
+                   value=getattr(info, 'value', None),
+                   create_kwargs=create_kwargs)
+
+
+def _storage_kwargs(info, var_dims: List[NcDim]) -> Tuple[Tuple[str, Any], ...]:
+    """根据变量的存储选项生成createVariable的压缩、分块及量化参数"""
+    storage = info.storage
+    if storage is None:
+        if info.nc_typ == NcType.string:    # 未配置存储选项的字符类型变量不压缩
+            return ()
+        storage = NcStorage()
+    kwargs = {}
+    if storage.compression is not None:
+        _check_compression(storage.compression, info.name)
+        kwargs.update(compression=storage.compression, complevel=storage.complevel, shuffle=storage.shuffle)
+    if storage.fletcher32:
+        kwargs['fletcher32'] = True
+    chunksizes = storage.chunksizes or _default_chunksizes(info.nc_typ, var_dims)
+    if chunksizes:
+        kwargs['chunksizes'] = tuple(chunksizes)
+    if info.nc_typ in (NcType.float, NcType.double):  # 量化仅对浮点型有效
+        if storage.significant_digits is not None:
+            kwargs.update(significant_digits=storage.significant_digits, quantize_mode=storage.quantize_mode)
+        if storage.least_significant_digit is not None:
+            kwargs['least_significant_digit'] = storage.least_significant_digit
+    return tuple(kwargs.items())
+
+
+def _check_compression(compression: str, name: str):
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"unknown compression {compression} of {name}, please choose in {list(COMPRESSIONS.keys())}")
+    flag = COMPRESSIONS[compression]
+    if flag is not None:
+        import netCDF4 as nc
+        if not getattr(nc, flag, False):
+            raise ValueError(f"compression {compression} of {name} is not supported by the installed netCDF-C library.")
+
+
+def _default_chunksizes(nc_typ: str, var_dims: List[NcDim]) -> Optional[Tuple[int, ...]]:
+    """含不限长维度的数值变量, 固定维度整块保存, 沿不限长维度按DEFAULT_CHUNK_BYTES确定记录数;
+    其余变量使用netCDF的默认分块"""
+    if nc_typ == NcType.string or all(d.value is not None for d in var_dims):
+        return None
+    record_bytes = np.dtype(nc_typ).itemsize * math.prod(d.value for d in var_dims if d.value is not None)
+    records = min(max(1, DEFAULT_CHUNK_BYTES // record_bytes), DEFAULT_CHUNK_RECORDS)
+    return tuple(records if d.value is None else d.value for d in var_dims)
@@ -0,0 +1,92 @@
+import queue
+import threading
+from itertools import islice
+from typing import Iterable, Iterator
+
+from log.metrics import timer
+
+
+_END = object()                                 # 数据读取结束的标记
+
+
+class Prefetcher:
+    def __init__(self, datas: Iterable, batch_size: int=1000, max_batches: int=4) -> None:
+        """后台线程按批从数据源(如mongo游标)中预读数据放入有界队列, 使数据库读取与nc文件写入重叠进行
+
+        Args:
+            datas (Iterable): 数据字典的可迭代对象
+            batch_size (int, optional): 每批读取的数据条数. Defaults to 1000.
+            max_batches (int, optional): 队列中最多缓存的批数, 限制内存占用. Defaults to 4.
+        """
+        self.datas = datas
+        self.batch_size = batch_size
+        self.queue = queue.Queue(maxsize=max_batches)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._produce, daemon=True)
+        self._thread.start()
+
+    def _put(self, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self):
+        try:
+            datas = iter(self.datas)
+            while not self._stop.is_set():
+                with timer('fetch'):
+                    batch = list(islice(datas, self.batch_size))
+                if len(batch) == 0:
+                    break
+                if not self._put(batch):
+                    return
+            self._put(_END)
+        except BaseException as exc:            # 将读取时的异常转交给消费者
+            self._put(exc)
+
+    def __iter__(self) -> Iterator[dict]:
+        try:
+            while True:
+                item = self.queue.get()
+                if item is _END:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield from item
+        finally:
+            self.close()
+
+    def close(self):
+        """停止后台读取线程"""
+        self._stop.set()
+        self._thread.join()
+
+
+def prefetch_docs(db_client, coll_name: str, generator, sql: dict=None, sortby=None,
+                  batch_size: int=1000, max_batches: int=4, extra_keys: Iterable[str]=(), hint=None,
+                  limit: int=None) -> Prefetcher:
+    """查询集合并在后台预读, 只取回生成器配置中用到的字段, 不返回_id
+
+    Args:
+        db_client (MyMongodb): 数据库对象
+        coll_name (str): 集合名
+        generator (NcGenerator): nc生成器, 根据其source_keys确定需要的字段
+        sql (dict, optional): 查询条件. Defaults to None.
+        sortby (optional): 排序字段. Defaults to None.
+        batch_size (int, optional): 游标及预读的批大小. Defaults to 1000.
+        max_batches (int, optional): 队列中最多缓存的批数. Defaults to 4.
+        extra_keys (Iterable[str], optional): 配置之外还需要的字段. Defaults to ().
+        hint (optional): 查询强制使用的索引. Defaults to None.
+        limit (int, optional): 最多读取的数据条数, 为None时不限制. Defaults to None.
+
+    Returns:
+        Prefetcher: 可迭代的预读对象
+    """
+    fields = generator.source_keys + tuple(extra_keys)
+    cursor = db_client.get_docs(coll_name, sortby=sortby, sql=sql, fields=fields, exclude_id=True, batch_size=batch_size, hint=hint,
+                                limit=limit)
+    return Prefetcher(cursor, batch_size=batch_size, max_batches=max_batches)
@@ -11,34 +11,70 @@ Copyright (c) 2024 by Zhongxiaowei, All Rights Reserved.
 import os
 import sys
 import time
+import atexit
+import queue
+import threading
 import logging
 import logging.handlers
 
 
 class Tee(object):
-    """一个同步重定向stdout和stderr输出到指定文件中的类
+    """将stdout和stderr的输出同时重定向到指定文件中的类, 输出先放入队列, 由后台线程写入文件及原stdout,
+    write不会因控制台或磁盘I/O阻塞调用方; flush等待队列中的输出全部写完, 程序退出时自动关闭
 
     Args:
         object (_type_): _description_
     """
     def __init__(self, name, mode='w'):
-        self.file = open(name + f"_{time.strftime('%F_%H:%M:%S')}.log", mode)
+        self.file = open(name + f"_{time.strftime('%F_%H:%M:%S')}.log", mode, buffering=1 << 16)    # 文件按块缓冲写入
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._drain, name="Tee", daemon=True)
+        self._thread.start()
         self.stdout = sys.stdout
         sys.stdout = self
         self.stderr = sys.stderr
         sys.stderr = self
+        atexit.register(self.close)
 
     def __del__(self):
-        sys.stdout = self.stdout
-        sys.stderr = self.stderr
-        self.file.close()
+        self.close()
+
+    def _drain(self):
+        while True:
+            data = self._queue.get()
+            try:
+                if data is None:
+                    return
+                self.file.write(data)
+                self.stdout.write(data)
+            finally:
+                self._queue.task_done()
 
     def write(self, data):
-        self.file.write(data)
-        self.stdout.write(data)
+        if self._thread.is_alive():
+            self._queue.put(data)
+        else:                                   # 已关闭或在fork出的子进程中(后台线程不存在)时直接写入
+            self.file.write(data)
+            self.stdout.write(data)
+        return len(data)
 
     def flush(self):
+        if self._thread.is_alive():
+            self._queue.join()
         self.file.flush()
+        self.stdout.flush()
+
+    def close(self):
+        """恢复stdout和stderr, 写完队列中剩余的输出后关闭文件, 可重复调用"""
+        if sys.stdout is self:
+            sys.stdout = self.stdout
+        if sys.stderr is self:
+            sys.stderr = self.stderr
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        if not self.file.closed:
+            self.file.close()
 
 
 class FormatterNormal(logging.Formatter):
@@ -47,27 +83,112 @@ class FormatterNormal(logging.Formatter):
         super().__init__(fmt, datefmt)
 
 
+_HANDLERS = {}      # 本模块添加到root日志记录器的handler: 'console'或日志文件的绝对路径 -> handler
+_LISTENER = None    # 主进程中持有实际handler的队列监听线程, 见start_queue_logging
+_QUEUE = None       # 主进程与工作进程共用的日志队列
+_IN_WORKER = False  # 是否为通过队列转发日志的工作进程
+
+
+def _add_handler(key: str, handler: logging.Handler):
+    """添加实际输出日志的handler: 开启队列日志时交给监听线程, 否则直接添加到root; 工作进程中不添加"""
+    if _IN_WORKER:
+        handler.close()
+        return
+    _HANDLERS[key] = handler
+    if _LISTENER is not None:
+        _LISTENER.handlers = _LISTENER.handlers + (handler, )
+    else:
+        logging.root.addHandler(handler)
+
+
 def setup_default_logging(default_level: int = logging.INFO, log_path: str = '', formatter: logging.Formatter = FormatterNormal()):
-    """配置root日志记录器
+    """配置root日志记录器, 可重复调用: 控制台handler只添加一次, 每个日志文件只添加一个文件handler,
+    不会移除已有的handler(包括其它模块配置的)
 
     Args:
         default_level (_type_, optional):       日志器的记录级别. Defaults to logging.INFO.
         log_path (str, optional):               文件日志器的位置, 默认不记录.
         formatter (logging.Formatter, optional):日志输出格式设置, 默认为FormatterNormal的实例
     """
-    # 清除原有的handler
-    if logging.root.hasHandlers():
-        for handler in logging.root.handlers:
-            logging.root.removeHandler(handler)
-    console_handler = logging.StreamHandler()
-    console_handler.setFormatter(formatter)
-    logging.root.addHandler(console_handler)
+    if _IN_WORKER:
+        return
+    if 'console' not in _HANDLERS:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(formatter)
+        _add_handler('console', console_handler)
     logging.root.setLevel(default_level)
-    if log_path:
+    if log_path and os.path.abspath(log_path) not in _HANDLERS:
         file_handler = logging.handlers.RotatingFileHandler(
             log_path, maxBytes=(1024 ** 2 * 2), backupCount=3)
         file_handler.setFormatter(formatter)
-        logging.root.addHandler(file_handler)
+        _add_handler(os.path.abspath(log_path), file_handler)
+
+
+def start_queue_logging(default_level: int = logging.INFO, log_path: str = '', formatter: logging.Formatter = FormatterNormal()):
+    """开启基于队列的日志: root日志记录器只将记录放入队列(不做I/O), 由主进程中的一个QueueListener线程
+    统一写入控制台及文件; 进程池的工作进程通过init_worker_logging将记录经同一队列转发给主进程,
+    多个进程不再同时写入(及滚动)同一日志文件. 重复调用时只追加新的日志文件, 程序退出时自动停止
+
+    Args:
+        default_level (int, optional):          日志器的记录级别. Defaults to logging.INFO.
+        log_path (str, optional):               文件日志器的位置, 默认不记录.
+        formatter (logging.Formatter, optional):日志输出格式设置, 默认为FormatterNormal的实例
+
+    Returns:
+        multiprocessing.Queue: 日志队列, 传给工作进程的init_worker_logging
+    """
+    global _LISTENER, _QUEUE
+    import multiprocessing
+    setup_default_logging(default_level, log_path, formatter)
+    if _LISTENER is not None:
+        return _QUEUE
+    handlers = tuple(_HANDLERS.values())
+    for handler in handlers:
+        logging.root.removeHandler(handler)
+    _QUEUE = multiprocessing.Queue(-1)
+    logging.root.addHandler(logging.handlers.QueueHandler(_QUEUE))
+    _LISTENER = logging.handlers.QueueListener(_QUEUE, *handlers, respect_handler_level=True)
+    _LISTENER.start()
+    atexit.register(stop_queue_logging)
+    return _QUEUE
+
+
+def stop_queue_logging():
+    """停止监听线程(写完队列中剩余的记录), 恢复为root日志记录器直接输出"""
+    global _LISTENER, _QUEUE
+    if _LISTENER is None:
+        return
+    _LISTENER.stop()
+    for handler in logging.root.handlers[:]:
+        if isinstance(handler, logging.handlers.QueueHandler) and handler.queue is _QUEUE:
+            logging.root.removeHandler(handler)
+    for handler in _LISTENER.handlers:
+        logging.root.addHandler(handler)
+    _LISTENER = _QUEUE = None
+
+
+def get_log_queue():
+    """当前进程开启队列日志时返回日志队列, 否则返回None"""
+    return _QUEUE
+
+
+def init_worker_logging(queue, level: int = logging.INFO):
+    """工作进程的初始化函数: 移除(fork时继承或导入时添加的)全部handler, 日志记录经队列转发给主进程,
+    此后工作进程中的setup_default_logging不再添加handler. queue为None时不做处理
+
+    Args:
+        queue (multiprocessing.Queue): 主进程start_queue_logging返回的日志队列
+        level (int, optional): 日志器的记录级别. Defaults to logging.INFO.
+    """
+    global _IN_WORKER
+    if queue is None:
+        return
+    _IN_WORKER = True
+    for handler in logging.root.handlers[:]:
+        logging.root.removeHandler(handler)     # 不调用close: 继承的handler由主进程关闭, 子进程中flush会重复写出缓冲区或阻塞在fork时被占用的锁上
+    _HANDLERS.clear()
+    logging.root.addHandler(logging.handlers.QueueHandler(queue))
+    logging.root.setLevel(level)
 
 
 def get_default_logger(name, log_path=''):
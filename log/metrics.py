@@ -0,0 +1,150 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Tuple
+
+
+def _key(name: str, labels: dict) -> Tuple[str, tuple]:
+    return name, tuple(sorted(labels.items()))
+
+
+class Metrics(object):
+    """轻量的阶段耗时及计数统计, 线程安全, 可导出为json或Prometheus textfile格式
+
+    计时器记录各阶段的次数、累计及最长耗时(秒), 计数器记录记录数、写入字节数、mongo往返次数等累计值,
+    二者都可以带标签(如var="Spectral_reflectivities")
+    """
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.timers: Dict[Tuple[str, tuple], Dict[str, float]] = {}
+        self.counters: Dict[Tuple[str, tuple], float] = {}
+
+    def reset(self):
+        """清空统计数据"""
+        with self._lock:
+            self.timers.clear()
+            self.counters.clear()
+
+    def observe(self, name: str, seconds: float, **labels):
+        """记录一次耗时"""
+        key = _key(name, labels)
+        with self._lock:
+            stat = self.timers.get(key)
+            if stat is None:
+                stat = self.timers[key] = {"count": 0, "total": 0., "max": 0.}
+            stat["count"] += 1
+            stat["total"] += seconds
+            stat["max"] = max(stat["max"], seconds)
+
+    def incr(self, name: str, value: float=1, **labels):
+        """累加计数器"""
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """计时上下文管理器, 代码块抛出异常时同样记录耗时
+
+        Example:
+            with METRICS.timer('close'):
+                nc_obj.close()
+        """
+        st = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - st, **labels)
+
+    def timed(self, name: str=None, **labels):
+        """计时装饰器, name默认为函数的限定名"""
+        def decorator(func):
+            stage = name or func.__qualname__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(stage, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def merge(self, snapshot: Dict[str, list]):
+        """合并其它进程的统计数据(snapshot()的返回值), 用于汇总工作进程的统计"""
+        with self._lock:
+            for stat in snapshot["timers"]:
+                key = _key(stat["name"], stat["labels"])
+                mine = self.timers.setdefault(key, {"count": 0, "total": 0., "max": 0.})
+                mine["count"] += stat["count"]
+                mine["total"] += stat["total"]
+                mine["max"] = max(mine["max"], stat["max"])
+            for stat in snapshot["counters"]:
+                key = _key(stat["name"], stat["labels"])
+                self.counters[key] = self.counters.get(key, 0) + stat["value"]
+
+    def snapshot(self) -> Dict[str, list]:
+        """返回当前统计数据, 形如 {"timers": [{"name", "labels", "count", "total", "max"}], "counters": [{"name", "labels", "value"}]}"""
+        with self._lock:
+            timers = [dict(name=name, labels=dict(labels), **stat) for (name, labels), stat in sorted(self.timers.items())]
+            counters = [dict(name=name, labels=dict(labels), value=value) for (name, labels), value in sorted(self.counters.items())]
+        return {"timers": timers, "counters": counters}
+
+    def to_json(self, **extra) -> str:
+        """导出为单行json, 便于作为结构化日志输出, extra为附加的字段(如进程号、文件名)"""
+        return json.dumps(dict(extra, time=time.strftime("%Y-%m-%d %H:%M:%S"), **self.snapshot()), ensure_ascii=False)
+
+    def log(self, logger, level: int=20, **extra):
+        """以结构化json的形式记录到日志器, 默认级别为INFO"""
+        logger.log(level, "metrics %s", self.to_json(**extra))
+
+    def to_prometheus(self, prefix: str='dataset_build') -> str:
+        """导出为Prometheus文本格式: 计时器输出<prefix>_<name>_seconds_total/_seconds_max/_count, 计数器输出<prefix>_<name>_total"""
+        snap = self.snapshot()
+        lines = []
+        for stat in snap["timers"]:
+            metric = f"{prefix}_{_metric_name(stat['name'])}"
+            labels = _prom_labels(stat["labels"])
+            lines.append(f"{metric}_seconds_total{labels} {stat['total']:.6f}")
+            lines.append(f"{metric}_seconds_max{labels} {stat['max']:.6f}")
+            lines.append(f"{metric}_count{labels} {stat['count']}")
+        for stat in snap["counters"]:
+            lines.append(f"{prefix}_{_metric_name(stat['name'])}_total{_prom_labels(stat['labels'])} {stat['value']}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str, prefix: str='dataset_build'):
+        """以原子替换的方式写入Prometheus textfile(供node_exporter的textfile collector读取)"""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding='utf8') as fp:
+            fp.write(self.to_prometheus(prefix))
+        os.replace(tmp_path, path)
+
+
+def _metric_name(name: str) -> str:
+    return "".join(c if c.isalnum() or c == '_' else '_' for c in name)
+
+
+def _prom_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    escape = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    items = ",".join(f'{k}="{escape(v)}"' for k, v in labels.items())
+    return "{" + items + "}"
+
+
+METRICS = Metrics()                                 # 进程内共享的统计对象
+
+
+def _reset_after_fork():
+    """fork出的子进程从零开始统计, 避免汇总时重复计入父进程的数据"""
+    METRICS._lock = threading.Lock()
+    METRICS.reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+timer = METRICS.timer
+timed = METRICS.timed
+incr = METRICS.incr
+observe = METRICS.observe
@@ -0,0 +1,97 @@
+import cProfile
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+from logging import getLogger
+from typing import Set, Union
+
+
+logger = getLogger(os.path.basename(__file__))
+
+PROFILE_ENV = 'DATASET_PROFILE'             # 开启性能分析的环境变量: cpu / memory / all, 多个用逗号分隔, 1等同于cpu
+PROFILE_DIR_ENV = 'DATASET_PROFILE_DIR'     # 解析等没有输出文件的流程保存分析结果的目录
+MODES = ('cpu', 'memory')
+
+
+def profile_modes(profile: Union[str, bool, None]=None) -> Set[str]:
+    """确定性能分析模式, profile为None时读取环境变量DATASET_PROFILE
+
+    Args:
+        profile (str / bool, optional): 'cpu'/'memory'/'all'或以逗号分隔的组合, True等同于'cpu', False/''为不分析. Defaults to None.
+
+    Returns:
+        Set[str]: 开启的分析模式, 为空时不分析
+    """
+    if profile is None:
+        profile = os.getenv(PROFILE_ENV, '')
+    if profile is True:
+        profile = 'cpu'
+    if not profile:
+        return set()
+    modes = set()
+    for mode in str(profile).lower().split(','):
+        mode = mode.strip()
+        if mode in ('1', 'true', 'cpu'):
+            modes.add('cpu')
+        elif mode in ('memory', 'mem'):
+            modes.add('memory')
+        elif mode == 'all':
+            modes.update(MODES)
+        elif mode not in ('', '0', 'false'):
+            raise ValueError(f"unknown profile mode {mode}, please choose in {MODES + ('all', )}.")
+    return modes
+
+
+@contextmanager
+def profiled(output_base: str, profile: Union[str, bool, None]=None, top: int=30):
+    """在cProfile和/或tracemalloc下运行代码块, 结束后将结果保存在output_base旁:
+    cpu模式保存 <output_base>.<进程号>.<时间>.pstats (可用pstats/snakeviz查看),
+    memory模式保存 <output_base>.<进程号>.<时间>.memory.txt (内存峰值及前top个分配位置);
+    文件名含进程号, 进程池中每个工作进程各自保存
+
+    Args:
+        output_base (str): 结果文件的路径前缀, 一般为输出文件的路径
+        profile (str / bool, optional): 分析模式, 为None时读取环境变量DATASET_PROFILE. Defaults to None.
+        top (int, optional): 记录的内存分配位置数. Defaults to 30.
+    """
+    modes = profile_modes(profile)
+    if not modes:
+        yield
+        return
+    profiler = None
+    if 'cpu' in modes:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:                  # 已有其它性能分析器在运行(如嵌套调用)
+            profiler = None
+    started_trace = 'memory' in modes and not tracemalloc.is_tracing()
+    if started_trace:
+        tracemalloc.start()
+    try:
+        yield
+    finally:
+        prefix = f"{output_base}.{os.getpid()}.{time.strftime('%Y%m%d%H%M%S')}"
+        output_dir = os.path.dirname(prefix)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(f"{prefix}.pstats")
+            logger.info(f"cpu profile is saved to {prefix}.pstats.")
+        if 'memory' in modes and tracemalloc.is_tracing():
+            _dump_memory(f"{prefix}.memory.txt", top)
+            if started_trace:
+                tracemalloc.stop()
+            logger.info(f"memory profile is saved to {prefix}.memory.txt.")
+
+
+def _dump_memory(path: str, top: int):
+    current, peak = tracemalloc.get_traced_memory()
+    snapshot = tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__), ))
+    with open(path, "w", encoding='utf8') as fp:
+        fp.write(f"current: {current / 1024 ** 2:.2f} MiB, peak: {peak / 1024 ** 2:.2f} MiB\n")
+        fp.write(f"top {top} allocations by line:\n")
+        for stat in snapshot.statistics('lineno')[:top]:
+            fp.write(f"{stat}\n")
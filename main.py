@@ -1,16 +1,17 @@
 from generate import NcGenerator
 from generate.config.microrain_radar_cfg import MicroRianRadarRawNCINFO
+from generate.prefetch import prefetch_docs
 from dbcontroller import get_mongo_cilent
 
 
-# 连接数据库,获取数据
-db_client = get_mongo_cilent()
-couser = db_client.get_docs('RRD_Lraw', limit=10)
-# print(list(couser))
-
 # 按配置数据nc生成器实例
 gc = NcGenerator(MicroRianRadarRawNCINFO)
 print(gc)
 
-# 传入数据生成nc
-gc.gerneral_nc('test.nc', list(couser))
\ No newline at end of file
+# 连接数据库, 后台预读数据(示例只取10条), 只取回配置中用到的字段
+db_client = get_mongo_cilent()
+db_client.ensure_indexes(['RRD_Lraw'])          # 确保(站点, 时间)复合索引存在, 已存在时不重建
+couser = prefetch_docs(db_client, 'RRD_Lraw', gc, sortby='Datetime', batch_size=1000, limit=10)
+
+# 传入数据生成nc, 流式分批消费游标, 无需将全部数据读入内存
+gc.gerneral_nc_stream('test.nc', couser, batch_size=1000)
\ No newline at end of file
@@ -1,8 +1,8 @@
 import json
-import pandas as pd
-from typing import IO
-
-import chardet  
+import os
+from dataclasses import dataclass
+import numpy as np
+from typing import IO, Any, Dict, List, Optional, Tuple, Union
 
 
 class BaseParser(object):
@@ -14,6 +14,7 @@ class BaseParser(object):
     
     
     def save2csv(self, file_name):
+        import pandas as pd                     # 按需导入, 缩短导入解析模块的时间
         pd.DataFrame(self.datas).to_csv(file_name, index=False)
     
     def save2json(self, file_name):
@@ -22,31 +23,130 @@ class BaseParser(object):
 
 
 
+@dataclass
+class TxtSection:
+    """文本文件中一个数值段到列的映射, 用于BaseTxtParser.parse_sections"""
+    name: str                                   # 段名
+    start: Union[int, str]                      # 起始行号(从0开始)或起始行的前缀
+    columns: List[str]                          # 列名
+    nrows: Optional[int] = None                 # 行数, None时到下一段的起始行或文件末尾
+    skip: int = 0                               # 起始行之后跳过的行数(如表头), 起始行为前缀时起始行本身总是跳过
+    delimiter: Optional[str] = None             # 分隔符, None为任意空白
+    colspecs: Optional[List[Tuple[int, int]]] = None    # 定宽列的[起, 止)字符位置, 设置后按定宽解析
+    dtype: Any = float                          # 数据类型
+
+
+_ENCODING_CACHE: Dict[Tuple[str, str], str] = {}   # (解析器类名, 目录) -> 编码
+
+
 class BaseTxtParser(BaseParser):
+    sections: List[TxtSection] = []             # 子类声明的数值段, 见parse_sections
+    buffer_size = 1 << 20                       # 文件读取缓冲区大小
+
     def __init__(self, file: str, mode: str='r', encoding: str='utf8') -> None:
         """文本文件类解析器
 
         Args:
             file (str): 文件名
             mode (str, optional): 打开文件的模式. Defaults to 'r'.
-            encoding (str, optional): 文件的编码，若传入空字符串，会使用chardet自动检测文件编码. Defaults to 'utf8'.
+            encoding (str, optional): 文件的编码，若传入空字符串，会使用chardet自动检测文件编码,
+                同一解析器类对同一目录下的文件只检测一次. Defaults to 'utf8'.
         """
         super().__init__()
-        self.fp = BaseTxtParser.openfile(file, mode, encoding)
+        self.fp = None
+        self.file = file
+        self.fp = type(self).openfile(file, mode, encoding)
+        self.encoding = self.fp.encoding if 'b' not in mode else None
     
     @staticmethod
     def encoding_detect(file: str, detect_size: int=4096) -> str:
+        import chardet
         with open(file, 'rb') as f:
             raw_data = f.read(detect_size)
             result = chardet.detect(raw_data)
             encoding = result['encoding']
             return encoding
 
-    @staticmethod
-    def openfile(file: str, mode: str, encoding: str) -> IO:
+    @classmethod
+    def cached_encoding_detect(cls, file: str) -> str:
+        """检测文件编码, 同一解析器类对同一目录下的文件只检测一次"""
+        key = (cls.__qualname__, os.path.dirname(os.path.abspath(file)))
+        encoding = _ENCODING_CACHE.get(key)
+        if encoding is None:
+            encoding = cls.encoding_detect(file)
+            if encoding is None or encoding.lower() == 'ascii':    # 纯ascii文件按其超集utf8缓存, 避免同目录其它文件解码失败
+                encoding = 'utf8'
+            _ENCODING_CACHE[key] = encoding
+        return encoding
+
+    @classmethod
+    def openfile(cls, file: str, mode: str, encoding: str) -> IO:
+        if 'b' in mode:
+            return open(file, mode, buffering=cls.buffer_size)
         if encoding == "":
-            encoding = BaseTxtParser.encoding_detect(file)
-        return open(file, mode, encoding=encoding)
+            encoding = cls.cached_encoding_detect(file)
+        return open(file, mode, encoding=encoding, buffering=cls.buffer_size)
+
+    def read_lines(self) -> List[str]:
+        """一次读取剩余的全部内容并按行分割"""
+        return self.fp.read().splitlines()
+
+    @staticmethod
+    def to_array(lines: List[str], dtype=float, delimiter: str=None, colspecs: List[Tuple[int, int]]=None) -> np.ndarray:
+        """将数值行批量转换为二维数组, 避免逐个调用float()
+
+        Args:
+            lines (List[str]): 文本行
+            dtype (optional): 数据类型. Defaults to float.
+            delimiter (str, optional): 分隔符, None为任意空白. Defaults to None.
+            colspecs (List[Tuple[int, int]], optional): 定宽列的[起, 止)字符位置, 设置后按定宽解析. Defaults to None.
+
+        Returns:
+            np.ndarray: 形状为(行数, 列数)的数组
+        """
+        if colspecs is not None:
+            cells = np.array([[line[st: ed] for st, ed in colspecs] for line in lines], dtype=str).reshape(len(lines), len(colspecs))
+            return np.char.strip(cells).astype(dtype)
+        return np.loadtxt(lines, dtype=dtype, delimiter=delimiter, ndmin=2)
+
+    def read_table(self, engine: str='c', **kwargs) -> 'pd.DataFrame':
+        """使用pandas读取分隔符表格文件, engine可选'c'或'pyarrow', 其余参数同pandas.read_csv"""
+        import pandas as pd
+        return pd.read_csv(self.file, encoding=self.encoding, engine=engine, **kwargs)
+
+    def parse_sections(self, lines: List[str]=None) -> Dict[str, Dict[str, np.ndarray]]:
+        """按self.sections声明的数值段批量解析
+
+        Args:
+            lines (List[str], optional): 文本行, 为None时读取文件剩余的全部内容. Defaults to None.
+
+        Returns:
+            Dict[str, Dict[str, np.ndarray]]: 段名 -> {列名: 一维数组}
+        """
+        if lines is None:
+            lines = self.read_lines()
+        bounds = [self._locate(lines, section) for section in self.sections]
+        res = {}
+        for i, (section, (_, start)) in enumerate(zip(self.sections, bounds)):
+            if section.nrows is not None:
+                end = start + section.nrows
+            else:                                       # 到其它段中下一段的起始行或文件末尾
+                end = min([begin for j, (begin, _) in enumerate(bounds) if j != i and begin >= start] + [len(lines)])
+            table = self.to_array(lines[start: end], section.dtype, section.delimiter, section.colspecs)
+            if table.shape[1] != len(section.columns):
+                raise ValueError(f"section {section.name} of {self.file} has {table.shape[1]} columns, expect {len(section.columns)}.")
+            res[section.name] = {col: table[:, j] for j, col in enumerate(section.columns)}
+        return res
+
+    @staticmethod
+    def _locate(lines: List[str], section: TxtSection) -> Tuple[int, int]:
+        """返回段的起始行号及段内数据的第一行行号"""
+        if isinstance(section.start, int):
+            return section.start, section.start + section.skip
+        for i, line in enumerate(lines):
+            if line.startswith(section.start):
+                return i, i + 1 + section.skip
+        raise ValueError(f"section {section.name} start with {section.start!r} not found.")
   
     def parse(self):
         """操作打开的文件指针self.fp,解析数据到self.datas中,并返回self.datas
@@ -78,4 +178,66 @@ class BaseCsvParser(BaseParser):
         Raises:
             NotImplementedError: _description_
         """
-        raise NotImplementedError
\ No newline at end of file
+        raise NotImplementedError
+
+
+class BaseBinaryParser(BaseParser):
+    record_dtype = None     # 子类定义的单条记录结构(numpy结构化dtype)
+    header_size = 0         # 文件头的字节数
+
+    def __init__(self, file: str, record_dtype=None, header_size: int=None) -> None:
+        """定长记录二进制文件解析器, 以内存映射的方式读取文件, 记录结构由numpy结构化dtype描述
+
+        Args:
+            file (str): 要解析的文件
+            record_dtype (optional): 单条记录结构, 如 np.dtype([('time', '<u4'), ('spectra', '<f4', (32, 64))]),
+                为None时使用类属性record_dtype. Defaults to None.
+            header_size (int, optional): 文件头的字节数, 为None时使用类属性header_size. Defaults to None.
+        """
+        super().__init__()
+        self.file = file
+        if record_dtype is not None:
+            self.record_dtype = record_dtype
+        if self.record_dtype is None:
+            raise ValueError(f"record_dtype of {type(self).__name__} is not defined.")
+        self.record_dtype = np.dtype(self.record_dtype)
+        if header_size is not None:
+            self.header_size = header_size
+
+    def read_header(self) -> bytes:
+        """读取文件头"""
+        with open(self.file, 'rb') as fp:
+            return fp.read(self.header_size)
+
+    def records(self) -> np.ndarray:
+        """将文件头之后的内容映射为结构化数组, 不复制数据, 末尾不足一条记录的字节被忽略
+
+        Returns:
+            np.ndarray: 只读的结构化数组(np.memmap)
+        """
+        data_size = os.path.getsize(self.file) - self.header_size
+        count = data_size // self.record_dtype.itemsize
+        if count <= 0:
+            return np.empty(0, dtype=self.record_dtype)
+        return np.memmap(self.file, dtype=self.record_dtype, mode='r', offset=self.header_size, shape=(count, ))
+
+    def columns(self, records: np.ndarray=None) -> Dict[str, np.ndarray]:
+        """按字段拆分为列数组, 各列均为records的视图
+
+        Args:
+            records (np.ndarray, optional): 结构化数组, 为None时使用self.records(). Defaults to None.
+
+        Returns:
+            Dict[str, np.ndarray]: 字段名到列数组的映射
+        """
+        if records is None:
+            records = self.records()
+        return {name: records[name] for name in records.dtype.names}
+
+    def parse(self):
+        """使用self.records()/self.columns()解析数据到self.datas中,并返回self.datas
+
+        Raises:
+            NotImplementedError: _description_
+        """
+        raise NotImplementedError
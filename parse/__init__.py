@@ -7,55 +7,120 @@ Description:
 
 Copyright (c) 2023 by Zhongxiaowei, All Rights Reserved. 
 '''
+import importlib
 import os
-from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import Callable
-from tqdm import tqdm
+from typing import Callable, Dict, Iterator, List, Union
 from logging import getLogger
 
-from . import BaseParser
-from . import station_data
+from log import init_worker_logging, start_queue_logging
+from log.profiling import PROFILE_DIR_ENV, profiled
 
 
 logger = getLogger(os.path.basename(__file__))
 __all__ = ['station_data', 'BaseParser']
 
 
+def __getattr__(name: str):
+    """首次访问时才导入子模块BaseParser/station_data(及numpy等依赖), 缩短导入parse的时间"""
+    if name in __all__:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _parse_files(parser_class, file_paths: List[str], args: tuple, kwargs: dict,
+                 profile: Union[str, bool]=None, profile_dir: str='') -> List[tuple]:
+    """在工作进程中依次解析一组文件, 单个文件失败不影响其余文件; 开启性能分析时每组文件各自保存分析结果
+
+    Returns:
+        List[tuple]: (文件路径, 解析结果, 错误信息) 列表, 成功时错误信息为None
+    """
+    results = []
+    output_base = os.path.join(profile_dir, f"parse_{os.path.basename(file_paths[0])}") if file_paths else ''
+    with profiled(output_base, profile):
+        for file_path in file_paths:
+            try:
+                parser = parser_class(file_path, *args, **kwargs)
+                results.append((file_path, parser.parse(), None))
+            except Exception as exc:
+                results.append((file_path, None, f"{type(exc).__name__}: {exc}"))
+    return results
+
 
 class FileProcessor:  
-    def __init__(self, parser_class: BaseParser, num_workers=4):  
+    def __init__(self, parser_class: 'BaseParser.BaseParser', num_workers=4, chunksize: int=None):  
+        """使用进程池并行解析文件
+
+        Args:
+            parser_class (BaseParser): 解析器类, 以文件路径构造, parse()返回解析结果列表
+            num_workers (int, optional): 工作进程数. Defaults to 4.
+            chunksize (int, optional): 每次提交给工作进程的文件数, 为None时按文件数自动确定. Defaults to None.
+        """
         self.num_workers = num_workers
         self.parser_class = parser_class
+        self.chunksize = chunksize
         self.result = []
+        self.errors: Dict[str, str] = {}            # 解析失败的文件及原因
 
     def filter_files(self, file_paths, filter_func: Callable=lambda x: x):
         """根据文件名过滤文件， 默认不过滤文件"""
         return filter(filter_func, file_paths)
+
+    def iter_files(self, file_paths, *args, profile: Union[str, bool]=None, profile_dir: str=None, **kwargs) -> Iterator[dict]:
+        """使用进程池处理文件, 按完成顺序逐条产出解析结果, 失败的文件记录在self.errors中;
+        解析器返回列表时逐条产出, 返回列式数据批(generate.columnar.RecordBatch)时整批产出;
+        工作进程的日志经队列交给主进程统一写入; profile/profile_dir见process_files"""
+        self.errors.clear()
+        profile_dir = self._profile_dir(profile_dir)
+        from tqdm import tqdm
+        files = list(self.filter_files(file_paths))
+        chunksize = self.chunksize or max(1, len(files) // (self.num_workers * 4))     # 小文件分块提交, 减少进程间通信次数
+        chunks = [files[st: st + chunksize] for st in range(0, len(files), chunksize)]
+        with ProcessPoolExecutor(max_workers=self.num_workers, initializer=init_worker_logging, initargs=(start_queue_logging(), )) as executor:
+            futures = {executor.submit(_parse_files, self.parser_class, chunk, args, kwargs, profile, profile_dir): chunk for chunk in chunks}
+            with tqdm(total=len(files)) as pbar:
+                for future in as_completed(futures):
+                    try:
+                        results = future.result()
+                    except Exception as exc:        # 工作进程异常退出等
+                        results = [(file_path, None, f"{type(exc).__name__}: {exc}") for file_path in futures[future]]
+                    for file_path, records, error in results:
+                        pbar.update(1)
+                        if error is not None:
+                            self.errors[file_path] = error
+                            logger.error(f"Error processing {file_path}: {error}")
+                        elif isinstance(records, (list, tuple)):
+                            yield from records
+                        else:                       # 列式数据批(RecordBatch)等整批产出
+                            yield records
     
-    def process_files(self, file_paths):  
-        """使用进程池处理文件""" 
+    def process_files(self, file_paths, *args, profile: Union[str, bool]=None, profile_dir: str=None, **kwargs):  
+        """使用进程池处理文件, 返回所有文件的解析结果
+
+        Args:
+            file_paths (Iterable[str]): 要解析的文件, 其余位置参数及关键字参数传给解析器的构造函数
+            profile (str / bool, optional): 性能分析模式'cpu'/'memory'/'all', 主进程及各工作进程分别保存分析结果,
+                为None时读取环境变量DATASET_PROFILE, 见log.profiling. Defaults to None.
+            profile_dir (str, optional): 分析结果的保存目录, 为None时读取环境变量DATASET_PROFILE_DIR, 默认为./profiles. Defaults to None.
+        """ 
         self.result.clear()
-        filtered_files = self.filter_files(file_paths)   
-        with ProcessPoolExecutor(max_workers=self.num_workers) as executor:  
-            futures = [executor.submit(self.process_file, file) for file in filtered_files]  
-            for future in tqdm(futures):
-                try:
-                    result = future.result()
-                except Exception as exc:
-                    print(f"Error processing {future.file_path}: {exc}")
+        profile_dir = self._profile_dir(profile_dir)
+        with profiled(os.path.join(profile_dir, "process_files"), profile):
+            self.result.extend(self.iter_files(file_paths, *args, profile=profile, profile_dir=profile_dir, **kwargs))
         return self.result
 
+    @staticmethod
+    def _profile_dir(profile_dir: str=None) -> str:
+        return profile_dir or os.getenv(PROFILE_DIR_ENV) or 'profiles'
+
     def process_file(self, file_path, *args, **kwargs):  
-        """处理单个文件"""
+        """在当前进程中处理单个文件"""
         parser = self.parser_class(file_path, *args, **kwargs)  
-        result = parser.parse(file_path)
-        self.result.extend(result)
-        return result
+        return parser.parse()
   
     def process_directory(self, directory):  
         """处理整个目录"""
-        self.result.clear()
         file_paths = [str(p) for p in Path(directory).rglob('*') if p.is_file()]  
         return self.process_files(file_paths)
 
@@ -84,5 +149,6 @@ class FileProcessor:
   
 # 使用示例  
 if __name__ == "__main__":  
+    from parse.BaseParser import BaseParser
     processor = FileProcessor(BaseParser, num_workers=2)  
     processor.process_directory("/path/to/your/directory")
\ No newline at end of file
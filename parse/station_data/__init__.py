@@ -9,16 +9,112 @@ Copyright (c) 2023 by Zhongxiaowei, All Rights Reserved.
 '''
 import json
 import os
+import threading
+from typing import Dict, Iterable
 
 from log import get_default_logger
 
 EQUIPMENT_JSON_FILE_MAP = {
     "RRD":"microrain_station.json",
+    "PAR":"phase_arrary_radar.json",
+}
+# 不同设备站点文件中字段名的统一映射
+FIELD_ALIASES = {
+    "site_code": "station_id",
+    "site_name": "station_name",
+    "site_name_zh": "station_name_zh",
 }
 logger = get_default_logger(os.path.basename(__file__))
 current_dir = os.path.dirname(__file__)
 
 
+class StationRegistry:
+    def __init__(self, json_file: str) -> None:
+        """站点信息注册表, 站点json文件只在首次使用或修改时间变化时读取, 并按站点ID建立索引
+
+        Args:
+            json_file (str): 站点json文件路径
+        """
+        self.json_file = json_file
+        self._mtime = None
+        self._stations = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # 传递到子进程时只传递文件路径, 由子进程自行加载
+        return {"json_file": self.json_file}
+
+    def __setstate__(self, state):
+        self.__init__(state["json_file"])
+
+    @staticmethod
+    def _normalize(station: dict) -> dict:
+        return {FIELD_ALIASES.get(k, k): v for k, v in station.items()}
+
+    def _refresh(self) -> Dict[str, dict]:
+        mtime = os.stat(self.json_file).st_mtime_ns
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    with open(self.json_file, "r", encoding='utf8') as fp:
+                        stations = {k: self._normalize(v) for k, v in json.load(fp).items()}
+                    if "_default" not in stations and stations:      # 自动生成'_default'
+                        stations["_default"] = {k: "0" for k in next(iter(stations.values())).keys()}
+                    self._stations = stations
+                    self._mtime = mtime
+                    logger.debug(f"load {len(stations)} stations from {self.json_file}.")
+        return self._stations
+
+    def get(self, station_id: str, return_default: bool=False) -> dict:
+        """获取站点信息
+
+        Args:
+            station_id (str): 站点ID
+            return_default (bool): 不存在此键时返回默认站点,默认关闭
+
+        Raises:
+            ValueError: 未开启return_default时站点不存在
+
+        Returns:
+            dict: 站点信息字典的副本
+        """
+        return self._lookup(self._refresh(), station_id, return_default)
+
+    def get_many(self, station_ids: Iterable[str], return_default: bool=False) -> Dict[str, dict]:
+        """批量获取站点信息, 只检查一次文件是否更新"""
+        stations = self._refresh()
+        return {station_id: self._lookup(stations, station_id, return_default) for station_id in station_ids}
+
+    @staticmethod
+    def _lookup(stations: Dict[str, dict], station_id: str, return_default: bool) -> dict:
+        if station_id in stations:
+            return dict(stations[station_id])
+        elif return_default and "_default" in stations:
+            logger.info(f"unknow station:{station_id}, use default.")
+            return dict(stations["_default"])
+        else:
+            raise ValueError(f"unknow station:{station_id}.")
+
+    def __contains__(self, station_id: str) -> bool:
+        return station_id in self._refresh()
+
+    def __len__(self) -> int:
+        return len(self._refresh())
+
+
+_REGISTRIES: Dict[str, StationRegistry] = {}       # 每个进程内按文件路径缓存的注册表
+_registries_lock = threading.Lock()
+
+
+def get_registry(json_file: str) -> StationRegistry:
+    """获取站点json文件对应的注册表, 同一进程内同一文件只创建一次"""
+    json_file = os.path.abspath(json_file)
+    registry = _REGISTRIES.get(json_file)
+    if registry is None:
+        with _registries_lock:
+            registry = _REGISTRIES.setdefault(json_file, StationRegistry(json_file))
+    return registry
+
 
 def _get_station_info(station_id, json_file, return_default=False):
     """根据配置json获取站点信息
@@ -33,26 +129,16 @@ def _get_station_info(station_id, json_file, return_default=False):
     Returns:
         _type_: _description_
     """
-    with open(json_file, "r", encoding='utf8') as fp:
-        stations = json.load(fp)
-    if station_id in stations:
-        return stations[station_id]
-    elif return_default:
-        logger.info(f"unknow station:{station_id}, use default.")
-        if "_default" not in stations:      # 自动生成'_default'
-            stations['_default'] = {k: "0" for k in stations[stations.keys()[0]].keys()}
-        default_dict = stations['_default']
-        return default_dict
-    else:
-        raise ValueError(f"unknow station:{station_id}.")
-
-
-def get_station_info(equipment, station_id) -> dict:
+    return get_registry(json_file).get(station_id, return_default)
+
+
+def get_station_info(equipment, station_id, return_default=False) -> dict:
     """根据设备类型和站点代号获取信息的字典
 
     Args:
         equipment (str): 设备名
         station_id (str): 站点代号
+        return_default (bool): 不存在此站点时返回默认站点,默认关闭
 
     Returns:
         _type_: 站点信息字典
@@ -61,7 +147,7 @@ def get_station_info(equipment, station_id) -> dict:
     if json_file_name is None:
         raise KeyError(f"not support equipment: {equipment}, please chiose in {EQUIPMENT_JSON_FILE_MAP.keys()}")
     json_file = os.path.join(current_dir, json_file_name)
-    return _get_station_info(station_id, json_file)
+    return _get_station_info(station_id, json_file, return_default)
 
 
 if __name__ == '__main__':
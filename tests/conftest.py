@@ -0,0 +1,84 @@
+import copy
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generate.config.BaseType import NcType
+
+
+Datetime = ('Datetime', None)
+Dime_HGT = ('Dime_HGT', 4)
+Dime_diam = ('Dime_diam', 3)
+
+# 小规模的生成配置, 结构与microrain_radar_cfg相同
+SMALL_NCINFO = {
+    "head": {
+        "head_grp1": [
+            ('station_id', ('Station_ID', NcType.string, (), 'Station identity', '-', '56691')),
+            ('-', ('Country', NcType.string, (), 'Country', '-', 'China')),
+            ('latitude', ('LAT', NcType.float, (), 'Latitude', '°', 26.86)),
+        ],
+        "head_grp3": [
+            ('-', ('Obse_begi_DT', NcType.string, (), 'Observing beginning datetime', 'yyyy-mm-dd hh:mm:ss', '')),
+            ('-', ('Obse_end_DT', NcType.string, (), 'Observing ending datetime', 'yyyy-mm-dd hh:mm:ss', '')),
+            ('-', ('Data_crea_DT', NcType.string, (), 'Data creating datetime', 'yyyy-mm-dd hh:mm:ss', '')),
+        ],
+    },
+    "observation": [
+        ('Datetime', NcType.string, (Datetime, ), 'Datetime', 'yyyy-mm-dd hh:mm:ss'),
+        ('HGT', NcType.ushort, (Datetime, Dime_HGT), 'Height in meters', 'm'),
+        ('Spectrum', NcType.double, (Datetime, Dime_HGT, Dime_diam), 'Spectral reflectivities', 'dB'),
+    ],
+    "name": ["RADA", "MODI", "MOBS", "SUOB", "WNFB", "", "RRD", "METE", "Lraw", "", "FMT", True],
+}
+
+
+@pytest.fixture(autouse=True, scope='session')
+def _log_path(tmp_path_factory):
+    """默认日志文件写到临时目录, 避免在仓库中创建log/log.txt"""
+    import generate.core
+    generate.core.LOG_PATH = str(tmp_path_factory.mktemp("log") / "log.txt")
+    return generate.core.LOG_PATH
+
+
+@pytest.fixture(autouse=True)
+def _no_log_file(monkeypatch):
+    """创建生成器时不配置默认日志"""
+    import generate.core
+    monkeypatch.setattr(generate.core, '_LOGGING_READY', True)
+
+
+@pytest.fixture
+def ncinfo():
+    return copy.deepcopy(SMALL_NCINFO)
+
+
+def make_records(n: int=10, start: datetime=datetime(2024, 1, 1), station: str='R7253', step: int=10):
+    """生成n条与SMALL_NCINFO对应的数据字典"""
+    rng = random.Random(n)
+    return [{
+        'station_id': station,
+        'latitude': 26.9,
+        'Datetime': (start + timedelta(seconds=step * i)).strftime('%Y-%m-%d %H:%M:%S'),
+        'HGT': [i + h for h in range(4)],
+        'Spectrum': [[rng.random() for _ in range(3)] for _ in range(4)],
+    } for i in range(n)]
+
+
+@pytest.fixture
+def db():
+    """以mongomock代替mongo服务器的数据库对象"""
+    mongomock = pytest.importorskip('mongomock')
+    from dbcontroller import MyMongodb
+    client = MyMongodb.__new__(MyMongodb)
+    client.link = 'mongodb://localhost:27017/'
+    client.shared = False
+    client.max_pool_size = 2
+    client.client = mongomock.MongoClient()
+    client.db = client.client['test']
+    return client
@@ -0,0 +1,52 @@
+from datetime import datetime
+
+import netCDF4 as nc
+import pytest
+
+from conftest import make_records
+from generate import NcGenerator, generate_to_gridfs, publish_nc
+
+
+class FakeLfs:
+    """记录上传内容的数据库对象, fail为True时上传失败"""
+    def __init__(self, fail: bool=False) -> None:
+        self.fail = fail
+        self.uploads = []
+
+    def upload_lfs(self, source, filename, metadata=None, coll='fs'):
+        self.uploads.append((source, filename, metadata, coll))
+        if self.fail:
+            raise IOError("upload failed")
+        return len(self.uploads)
+
+
+def test_generate_to_gridfs(ncinfo):
+    generator, db = NcGenerator(ncinfo), FakeLfs()
+    recs = make_records(6)
+    assert generate_to_gridfs(generator, db, recs, station='R7253', win_st=datetime(2024, 1, 1)) == 1
+    source, filename, metadata, coll = db.uploads[0]
+    assert filename == generator.generate_fileanme(datetime(2024, 1, 1), station_code='R7253') and coll == 'nc_files'
+    assert metadata['records'] == 6 and metadata['config'] == generator.plan.fingerprint
+    with pytest.raises(ValueError):                 # 上传后释放内存
+        bytes(source)
+
+
+def test_generate_to_gridfs_releases_buffer_on_failure(ncinfo):
+    db = FakeLfs(fail=True)
+    with pytest.raises(IOError):
+        generate_to_gridfs(NcGenerator(ncinfo), db, make_records(3), win_st=datetime(2024, 1, 1))
+    with pytest.raises(ValueError):
+        bytes(db.uploads[0][0])
+
+
+def test_publish_nc_requires_filename_or_window(tmp_path, ncinfo):
+    generator, db = NcGenerator(ncinfo), FakeLfs()
+    with pytest.raises(ValueError, match="filename"):
+        publish_nc(db, generator, b"data")
+    path = str(tmp_path / "a.nc")
+    generator.gerneral_nc_stream(path, make_records(2))
+    publish_nc(db, generator, path, station='R7253')
+    publish_nc(db, generator, b"data", filename="b.nc")
+    assert [u[1] for u in db.uploads] == ["a.nc", "b.nc"]
+    with nc.Dataset(path) as ds:
+        assert ds.dimensions['Datetime'].size == 2
@@ -0,0 +1,81 @@
+import netCDF4 as nc
+import numpy as np
+import pytest
+
+from conftest import make_records
+from generate import NcGenerator
+from generate.columnar import RecordBatch
+
+
+def _batch(n=4, start=0, **head):
+    return RecordBatch({'x': np.arange(start, start + n), 'y': np.ones((n, 2))}, head)
+
+
+def test_record_batch_basics():
+    batch = _batch(4, station_id='A')
+    assert len(batch) == 4 and 'x' in batch and 'station_id' in batch
+    assert batch.record(1) == {'station_id': 'A', 'x': 1, 'y': [1., 1.]}
+    assert list(batch.column('station_id')) == ['A'] * 4
+    assert list(batch.slice(1, 3).column('x')) == [1, 2]
+    assert list(batch.take([3, 0]).column('x')) == [3, 0]
+    assert batch.to_docs()[0] == {'station_id': 'A', 'x': 0, 'y': [1., 1.]}
+    assert len(RecordBatch({})) == 0
+    with pytest.raises(ValueError):
+        RecordBatch({'x': [1, 2], 'y': [1]})
+
+
+def test_from_docs_roundtrip():
+    docs = [{'_id': i, 'station_id': 'A', 'x': i, 'y': [i, i]} for i in range(3)]
+    batch = RecordBatch.from_docs(docs, head_keys=['station_id'], dtypes={'x': np.int16})
+    assert batch.head == {'station_id': 'A'} and batch.column('x').dtype == np.int16
+    assert batch.to_docs() == [{k: v for k, v in d.items() if k != '_id'} for d in docs]
+    assert len(RecordBatch.from_docs([])) == 0
+
+
+def test_concat_head_and_columns():
+    batch = RecordBatch.concat([_batch(2, 0, station_id='A', level=1), _batch(0), _batch(3, 2, station_id='B', level=1)])
+    assert list(batch.column('x')) == [0, 1, 2, 3, 4]
+    assert batch.head == {'level': 1}
+    assert list(batch.column('station_id')) == ['A', 'A', 'B', 'B', 'B']
+    mixed = RecordBatch.concat([_batch(1, station_id='A'), RecordBatch({'x': [5], 'y': [[0, 0]], 'station_id': ['C']})])
+    assert list(mixed.column('station_id')) == ['A', 'C']
+    assert len(RecordBatch.concat([])) == 0
+
+
+def test_array_head_values(tmp_path, ncinfo):
+    hgt = [0, 35, 70, 105]
+    recs = [dict(r, HGT=hgt) for r in make_records(5)]
+    batch = RecordBatch.from_docs(recs, head_keys=['station_id', 'HGT'])
+    assert batch.column('HGT').shape == (5, 4)
+    merged = RecordBatch.concat([batch.slice(0, 2), batch.slice(2, 5)])
+    assert merged.head['HGT'] == hgt
+    changed = RecordBatch.concat([batch.slice(0, 2), RecordBatch(batch.slice(2, 5).columns, dict(batch.head, HGT=[1, 2, 3, 4]))])
+    np.testing.assert_array_equal(changed.column('HGT'), [hgt] * 2 + [[1, 2, 3, 4]] * 3)
+    path = str(tmp_path / "hgt.nc")
+    assert NcGenerator(ncinfo).gerneral_nc(path, batch) == 5
+    with nc.Dataset(path) as ds:
+        np.testing.assert_array_equal(ds['observation/HGT'][:], [hgt] * 5)
+
+
+def test_concat_missing_keys():
+    with pytest.raises(ValueError, match="z"):
+        RecordBatch.concat([_batch(2), RecordBatch({'x': [1], 'y': [[0, 0]], 'z': [1]})])
+
+
+def test_generate_from_record_batch(tmp_path, ncinfo):
+    recs = make_records(7)
+    batch = RecordBatch.from_docs(recs, head_keys=['station_id', 'latitude'])
+    path = str(tmp_path / "batch.nc")
+    generator = NcGenerator(ncinfo)
+    assert generator.gerneral_nc(path, batch) == 7
+    with nc.Dataset(path) as ds:
+        assert list(ds['observation/Datetime'][:]) == [r['Datetime'] for r in recs]
+        np.testing.assert_allclose(ds['observation/Spectrum'][:], [r['Spectrum'] for r in recs])
+        assert ds['head/head_grp1/Station_ID'][...] == 'R7253'
+
+
+def test_generate_empty_input(tmp_path, ncinfo):
+    generator = NcGenerator(ncinfo)
+    for datas in ([], RecordBatch({})):
+        assert generator.gerneral_nc(str(tmp_path / "empty.nc"), datas) == 0
+    assert not (tmp_path / "empty.nc").exists()
@@ -0,0 +1,140 @@
+from types import SimpleNamespace
+
+import bson
+import pytest
+from bson.objectid import ObjectId
+from pymongo.errors import OperationFailure
+
+from conftest import make_records
+from dbcontroller import split_chunks
+from generate.columnar import RecordBatch
+
+mongomock = pytest.importorskip('mongomock')
+
+
+@pytest.fixture
+def filled(db):
+    db.db['RRD_Lraw'].insert_many(make_records(5))
+    return db
+
+
+def test_get_docs_fields(filled):
+    docs = list(filled.get_docs('RRD_Lraw', sortby='Datetime', fields=['Datetime', 'HGT'], exclude_id=True))
+    assert len(docs) == 5 and set(docs[0]) == {'Datetime', 'HGT'}
+
+
+def test_get_docs_projection_alias(filled):
+    docs = list(filled.get_docs('RRD_Lraw', projection={'Datetime': 1, '_id': 0}, limit=2))
+    assert docs == [{'Datetime': d['Datetime']} for d in make_records(2)]
+    with pytest.raises(ValueError):
+        filled.get_docs('RRD_Lraw', projection={'Datetime': 1}, fields=['HGT'])
+
+
+def test_split_chunks_by_bytes():
+    docs = [{'i': i, 'payload': 'x' * 1000} for i in range(50)]
+    chunks = split_chunks(docs, chunk_bytes=10 * len(bson.encode(docs[0])))
+    assert [len(c) for c in chunks] == [10] * 5
+    assert [d for c in chunks for d in c] == docs
+    assert split_chunks([]) == []
+    assert len(split_chunks(docs, chunk_bytes=1)) == 50               # 至少每批一条
+
+
+def test_save_docs_chunks_in_parallel(db, monkeypatch):
+    calls = []
+    insert_many = mongomock.Collection.insert_many
+    monkeypatch.setattr(mongomock.Collection, 'insert_many', lambda self, docs, **kwargs: calls.append(len(docs)) or insert_many(self, docs, **kwargs))
+    docs = make_records(40)
+    assert db.save_docs(docs, 'RRD_Lraw', extend_dict={'source': 'test'}, chunk_bytes=1024 * 4) == 40
+    assert len(calls) > 1 and sum(calls) == 40
+    assert db.db['RRD_Lraw'].count_documents({'source': 'test'}) == 40
+    assert all('_id' not in d and 'source' not in d for d in docs)          # 不修改传入的文档
+    batch = RecordBatch.from_docs(make_records(5), head_keys=['station_id'])
+    assert db.save_docs(batch, 'batch', num_threads=1) == 5
+    assert db.db['batch'].find_one({}, {'_id': 0})['station_id'] == 'R7253'
+
+
+def _bulk_write(self, requests, ordered=True):
+    """mongomock不支持ReplaceOne的bulk_write, 逐条替换; 与mongo一样, 替换内容的_id与已有文档不同时报错"""
+    matched = upserted = 0
+    for request in requests:
+        old = self.find_one(request._filter)
+        if old is not None and '_id' in request._doc and request._doc['_id'] != old['_id']:
+            raise OperationFailure("Performing an update on the path '_id' would modify the immutable field '_id'")
+        self.replace_one(request._filter, request._doc, upsert=True)
+        matched += old is not None
+        upserted += old is None
+    return SimpleNamespace(matched_count=matched, upserted_count=upserted)
+
+
+def test_save_docs_upsert_is_idempotent(db, monkeypatch):
+    monkeypatch.setattr(mongomock.Collection, 'bulk_write', _bulk_write)
+    docs = make_records(6)
+    assert db.save_docs(docs, 'RRD_Lraw', upsert=True) == 6
+    stored = list(db.get_docs('RRD_Lraw', sortby='Datetime'))
+    again = [dict(d, latitude=30.) for d in stored[:3]]
+    again[0]['_id'] = ObjectId()                                      # 与已存在文档不同的_id
+    assert db.save_docs(again + docs[3:], 'RRD_Lraw', upsert=True, chunk_bytes=1024) == 6
+    assert db.db['RRD_Lraw'].count_documents({}) == 6
+    assert db.db['RRD_Lraw'].count_documents({'latitude': 30.}) == 3
+
+
+def _shared(pool_size=3):
+    from dbcontroller import MyMongodb
+    return MyMongodb('localhost', 'u', 'p', 'test', port=1, maxPoolSize=pool_size, shared=True)
+
+
+def test_close_shared_client_keeps_other_holders_open():
+    from pymongo.errors import InvalidOperation
+    a, b = _shared(), _shared()
+    assert a.client is b.client
+    a.close_mongodb_client()
+    a.close_mongodb_client()                        # 重复关闭只释放一次
+    assert not b.client._closed                     # 其它持有者仍可使用
+    b.close_mongodb_client()
+    assert b.client._closed
+    with pytest.raises(InvalidOperation):
+        b.client.list_database_names()
+    c = _shared()                                   # 最后一个持有者关闭后重新创建
+    assert c.client is not b.client
+    c.close_mongodb_client()
+
+
+def _child_clients():
+    import os
+
+    import dbcontroller.pool as pool
+    state = (len(pool._CLIENTS), pool._CLIENTS_PID == os.getpid(), pool.METRICS.snapshot()["checkouts"])
+    client = pool.shared_client("mongodb://localhost:1/", maxPoolSize=3)
+    pool.release_client(client)
+    return state
+
+
+def test_shared_clients_reset_after_fork():
+    import multiprocessing
+
+    import dbcontroller.pool as pool
+    a = _shared()
+    pool.METRICS.checkouts += 5
+    try:
+        with multiprocessing.get_context('fork').Pool(1) as workers:
+            assert workers.apply(_child_clients) == (0, True, 0)
+        assert a.client in pool._CLIENTS.values()   # 父进程的客户端不受影响
+    finally:
+        pool.METRICS.checkouts -= 5
+        a.close_mongodb_client()
+
+
+def test_metrics_from_events():
+    from dbcontroller.pool import MongoMetrics
+    metrics = MongoMetrics()
+    event = SimpleNamespace(command_name='insert', duration_micros=2000)
+    metrics.succeeded(event)
+    metrics.failed(SimpleNamespace(command_name='insert', duration_micros=4000))
+    metrics.connection_created(None)
+    metrics.connection_check_out_started(None)
+    metrics.connection_checked_out(None)
+    snapshot = metrics.snapshot()
+    assert snapshot["commands"]["insert"] == {"count": 2, "failed": 1, "total": pytest.approx(0.006), "max": pytest.approx(0.004)}
+    assert (snapshot["connections"], snapshot["checked_out"], snapshot["checkouts"]) == (1, 1, 1)
+    metrics.connection_checked_in(None)
+    assert metrics.snapshot()["checked_out"] == 0
@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from generate import NcGenerator
+from generate.export import iter_windows, plan_export_jobs, window_start
+
+
+def test_iter_windows_aligns_to_window():
+    windows = list(iter_windows(datetime(2024, 1, 1, 10, 30), datetime(2024, 1, 1, 13), 'hourly'))
+    assert windows == [(datetime(2024, 1, 1, h), datetime(2024, 1, 1, h + 1)) for h in (10, 11, 12)]
+    assert list(iter_windows(datetime(2024, 1, 2), datetime(2024, 1, 2), 'daily')) == []
+    assert window_start(datetime(2024, 1, 2, 23, 59), timedelta(hours=6)) == datetime(2024, 1, 2, 18)
+    with pytest.raises(ValueError):
+        list(iter_windows(datetime(2024, 1, 1), datetime(2024, 1, 2), 'weekly'))
+
+
+def test_filename_with_empty_fields(ncinfo):
+    ncinfo["name"][3] = ''                      # 四级分类名及站点代码为空
+    generator = NcGenerator(ncinfo)
+    st = datetime(2024, 1, 1, 8)
+    assert generator.generate_fileanme(st, station_code='R7253') == "RADA_MODI_MOBS__WNFB_R7253_RRD_METE_Lraw_20240101_080000_FMT_QC.nc"
+    assert generator.generate_fileanme(st) == "RADA_MODI_MOBS__WNFB_RRD_METE_Lraw_20240101_080000_FMT_QC.nc"
+    assert generator.generate_fileanme("2024-01-01 08:00:00.250", 'R7253').endswith("_20240101_080000_250_FMT_QC.nc")
+
+
+def test_plan_export_jobs_skips_existing(tmp_path, ncinfo):
+    generator = NcGenerator(ncinfo)
+    start, end = datetime(2024, 1, 1), datetime(2024, 1, 3)
+    jobs = plan_export_jobs(generator, 'RRD_Lraw', str(tmp_path), ['A', 'B'], start, end)
+    assert len(jobs) == 4
+    assert jobs[0].sql == {'station_id': 'A', 'Datetime': {'$gte': '2024-01-01 00:00:00', '$lt': '2024-01-02 00:00:00'}}
+    (tmp_path / 'A').mkdir()
+    open(jobs[0].nc_path, 'w').close()
+    assert len(plan_export_jobs(generator, 'RRD_Lraw', str(tmp_path), ['A', 'B'], start, end)) == 3
@@ -0,0 +1,44 @@
+import os
+from datetime import datetime
+
+import netCDF4 as nc
+
+from conftest import make_records
+from generate import JsonWatermarkStore, MongoWatermarkStore, export_incremental
+
+
+def test_json_watermark_store(tmp_path):
+    path = str(tmp_path / "state.json")
+    store = JsonWatermarkStore(path)
+    assert store.get('RRD_Lraw', 'A') is None
+    store.set('RRD_Lraw', 'A', {"last": "2024-01-01 00:00:00", "nc_path": "a.nc", "count": 3})
+    assert JsonWatermarkStore(path).get('RRD_Lraw', 'A')["count"] == 3
+    assert not os.path.exists(path + ".tmp")
+
+
+def test_mongo_watermark_store(db):
+    store = MongoWatermarkStore(db)
+    assert store.get('RRD_Lraw', 'A') is None
+    store.set('RRD_Lraw', 'A', {"last": "t1", "nc_path": "a.nc", "count": 1})
+    store.set('RRD_Lraw', 'A', {"last": "t2", "nc_path": "a.nc", "count": 2})
+    assert store.get('RRD_Lraw', 'A') == {"last": "t2", "nc_path": "a.nc", "count": 2}
+    assert db.db['export_watermark'].count_documents({}) == 1
+
+
+def test_export_incremental_appends_and_rolls(tmp_path, ncinfo, db):
+    store = JsonWatermarkStore(str(tmp_path / "state.json"))
+    recs = make_records(500, start=datetime(2024, 1, 1, 22, 30))        # 22:30 ~ 23:53, 跨两个整点窗口
+    db.db['RRD_Lraw'].insert_many([dict(r) for r in recs[:200]])
+    out = str(tmp_path / "out")
+    assert export_incremental(ncinfo, 'RRD_Lraw', out, ['R7253'], store, db, window='hourly') == {'R7253': 200}
+    assert export_incremental(ncinfo, 'RRD_Lraw', out, ['R7253'], store, db, window='hourly') == {'R7253': 0}
+    db.db['RRD_Lraw'].insert_many([dict(r) for r in recs[200:]])
+    assert export_incremental(ncinfo, 'RRD_Lraw', out, ['R7253'], store, db, window='hourly') == {'R7253': 300}
+    state = store.get('RRD_Lraw', 'R7253')
+    assert state["last"] == recs[-1]['Datetime']
+    times = []
+    for name in sorted(os.listdir(os.path.join(out, 'R7253'))):
+        with nc.Dataset(os.path.join(out, 'R7253', name)) as ds:
+            times.extend(ds['observation/Datetime'][:])
+    assert times == [r['Datetime'] for r in recs]
+    assert state["count"] == len([t for t in times if t >= "2024-01-01 23:00:00"])
@@ -0,0 +1,62 @@
+import logging
+import logging.handlers
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from conftest import make_records
+from generate import NcJob, generate_many
+from log import Tee, get_log_queue, init_worker_logging, setup_default_logging
+
+
+class SlowStream:
+    def __init__(self) -> None:
+        self.data = []
+
+    def write(self, data):
+        time.sleep(0.05)
+        self.data.append(data)
+
+    def flush(self):
+        pass
+
+
+def test_tee_writes_in_background(tmp_path, monkeypatch):
+    stream = SlowStream()
+    monkeypatch.setattr(sys, 'stdout', stream)
+    monkeypatch.setattr(sys, 'stderr', stream)
+    tee = Tee(str(tmp_path / "tee"))
+    st = time.perf_counter()
+    for i in range(5):
+        print(i)
+    assert time.perf_counter() - st < 0.1                   # 不等待控制台写入
+    tee.flush()
+    assert "".join(stream.data) == "0\n1\n2\n3\n4\n"
+    tee.close()
+    assert sys.stdout is stream and sys.stderr is stream
+    log_file, = tmp_path.iterdir()
+    assert log_file.read_text() == "0\n1\n2\n3\n4\n"
+
+
+def _worker_handlers(log_path):
+    setup_default_logging(log_path=log_path)                # 工作进程中不添加handler
+    logging.getLogger("worker").info("hello from worker %s", os.getpid())
+    return [type(h).__name__ for h in logging.root.handlers]
+
+
+def test_generate_many_logs_through_queue(tmp_path, ncinfo, _log_path):
+    jobs = [NcJob(str(tmp_path / f"{i}.nc"), datas=make_records(3)) for i in range(3)]
+    assert all(r.ok for r in generate_many(ncinfo, jobs, num_workers=2))
+    queue = get_log_queue()
+    assert queue is not None
+    with ProcessPoolExecutor(max_workers=1, initializer=init_worker_logging, initargs=(queue, )) as executor:
+        handlers = executor.submit(_worker_handlers, str(tmp_path / "worker.txt")).result()
+    assert handlers == ['QueueHandler']
+    assert not (tmp_path / "worker.txt").exists()
+    file_handlers = [h for h in logging.root.handlers if isinstance(h, logging.handlers.RotatingFileHandler)]
+    assert file_handlers == []                              # 主进程中由监听线程写入文件
+    time.sleep(0.2)                                         # 等待监听线程写完队列中的记录
+    text = open(_log_path).read()
+    assert all(text.count(f"has generated nc file {job.nc_path}") == 1 for job in jobs)
+    assert "hello from worker" in text
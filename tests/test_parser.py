@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+
+import parse.BaseParser as base_parser
+from parse.BaseParser import BaseBinaryParser, BaseTxtParser, TxtSection
+
+
+def _parser(tmp_path, text, sections=(), encoding='utf8', name="data.txt"):
+    path = tmp_path / name
+    path.write_text(text, encoding='utf8')
+    parser_class = type("SectionParser", (BaseTxtParser, ), {"sections": list(sections)})
+    return parser_class(str(path), encoding=encoding)
+
+
+def test_to_array_delimited():
+    table = BaseTxtParser.to_array(["1,2,3", "4,5,6"], delimiter=',')
+    np.testing.assert_array_equal(table, [[1, 2, 3], [4, 5, 6]])
+    assert BaseTxtParser.to_array(["7 8"], dtype=int).shape == (1, 2)
+
+
+def test_to_array_fixed_width():
+    table = BaseTxtParser.to_array(["  1.5 20", " 10.0  3"], colspecs=[(0, 5), (5, 8)])
+    np.testing.assert_array_equal(table, [[1.5, 20], [10, 3]])
+
+
+def test_parse_sections_int_start(tmp_path):
+    parser = _parser(tmp_path, "1 2\n3 4\n", [TxtSection('a', 0, ['x', 'y'])])
+    res = parser.parse_sections()
+    np.testing.assert_array_equal(res['a']['x'], [1, 3])
+    np.testing.assert_array_equal(res['a']['y'], [2, 4])
+
+
+def test_parse_sections_prefix_and_int_starts(tmp_path):
+    text = "x y\n1 2\n3 4\n[B]\nz\n5\n6\n7\n"
+    sections = [TxtSection('a', 0, ['x', 'y'], skip=1),     # 到下一段的起始行为止
+                TxtSection('b', '[B]', ['z'], skip=1, nrows=2)]
+    res = _parser(tmp_path, text, sections).parse_sections()
+    np.testing.assert_array_equal(res['a']['y'], [2, 4])
+    np.testing.assert_array_equal(res['b']['z'], [5, 6])
+
+
+def test_parse_sections_column_mismatch(tmp_path):
+    parser = _parser(tmp_path, "1 2 3\n", [TxtSection('a', 0, ['x', 'y'])])
+    with pytest.raises(ValueError, match="has 3 columns, expect 2"):
+        parser.parse_sections()
+
+
+def test_encoding_detected_once_per_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(base_parser, '_ENCODING_CACHE', {})
+    calls = []
+
+    def detect(file, detect_size=4096):
+        calls.append(file)
+        return 'ascii'
+
+    monkeypatch.setattr(BaseTxtParser, 'encoding_detect', staticmethod(detect))
+    first = _parser(tmp_path, "1\n", encoding='', name="a.txt")
+    second = _parser(tmp_path, "2\n", encoding='', name="b.txt")
+    assert len(calls) == 1
+    assert first.encoding == second.encoding == 'utf8'      # ascii按utf8缓存
+    (tmp_path / "sub").mkdir()
+    _parser(tmp_path, "3\n", encoding='', name="sub/c.txt")
+    assert len(calls) == 2
+
+
+RECORD = np.dtype([('time', '<u4'), ('spectra', '<f4', (2, 3))])
+
+
+class RadarBinaryParser(BaseBinaryParser):
+    record_dtype = RECORD
+    header_size = 8
+
+
+def test_binary_records_and_columns(tmp_path):
+    path = tmp_path / "data.bin"
+    records = np.zeros(3, dtype=RECORD)
+    records['time'] = [10, 20, 30]
+    records['spectra'] = np.arange(18).reshape(3, 2, 3)
+    path.write_bytes(b"HEADER01" + records.tobytes() + b"\x00" * (RECORD.itemsize - 1))  # 末尾不足一条记录
+    parser = RadarBinaryParser(str(path))
+    assert parser.read_header() == b"HEADER01"
+    mapped = parser.records()
+    assert len(mapped) == 3
+    columns = parser.columns(mapped)
+    assert columns['time'].tolist() == [10, 20, 30]
+    assert columns['spectra'].shape == (3, 2, 3)
+    np.testing.assert_array_equal(columns['spectra'], records['spectra'])
+    for col in columns.values():
+        assert not col.flags.writeable and np.shares_memory(col, mapped)
+
+
+def test_binary_empty_file(tmp_path):
+    for content in (b"", b"HEADER01", b"HEADER01" + b"\x00" * (RECORD.itemsize - 1)):
+        path = tmp_path / "empty.bin"
+        path.write_bytes(content)
+        parser = RadarBinaryParser(str(path))
+        records = parser.records()
+        assert len(records) == 0 and records.dtype == RECORD
+        assert parser.columns(records)['spectra'].shape == (0, 2, 3)
+
+
+def test_binary_record_dtype_required(tmp_path):
+    with pytest.raises(ValueError, match="record_dtype"):
+        BaseBinaryParser(str(tmp_path / "x.bin"))
+    assert BaseBinaryParser(str(tmp_path / "x.bin"), record_dtype='<f4', header_size=4).record_dtype == np.dtype('<f4')
@@ -0,0 +1,89 @@
+import json
+import os
+import random
+from datetime import datetime
+
+import netCDF4 as nc
+import pytest
+
+from conftest import make_records
+from generate import parse_to_nc
+from generate.columnar import RecordBatch
+from generate.pipeline import SpillFile, _GroupSpiller
+from parse import FileProcessor
+from parse.BaseParser import BaseParser
+
+
+class JsonParser(BaseParser):
+    def __init__(self, file):
+        super().__init__()
+        self.file = file
+
+    def parse(self):
+        with open(self.file) as fp:
+            docs = json.load(fp)
+        if os.path.basename(self.file).startswith("batch"):
+            return RecordBatch.from_docs(docs, head_keys=['latitude'])
+        return docs
+
+
+def _write_inputs(folder, recs, size):
+    os.makedirs(folder)
+    paths = []
+    for i in range(0, len(recs), size):
+        path = os.path.join(folder, f"{'batch' if i % (2 * size) else 'docs'}_{i}.json")
+        with open(path, "w") as fp:
+            json.dump(recs[i: i + size], fp)
+        paths.append(path)
+    return paths
+
+
+class FailingDb:
+    def save_docs(self, docs, coll_name):
+        raise IOError("mongo is down")
+
+
+def test_spill_file_roundtrip(tmp_path):
+    recs = make_records(6)
+    spill = SpillFile(str(tmp_path / "0.pkl"))
+    spill.append(recs[3:][::-1])
+    spill.append([RecordBatch.from_docs(recs[:3])])
+    batch, = list(spill)
+    assert list(batch.column('Datetime')) == [r['Datetime'] for r in recs]
+
+
+def test_group_spiller_bounds_memory(tmp_path):
+    spiller = _GroupSpiller(str(tmp_path), 'Datetime', batch_size=4, max_buffered=6)
+    recs = make_records(20)
+    for i, rec in enumerate(recs):
+        spiller.add(('A' if i % 2 else 'B', datetime(2024, 1, 1)), rec)
+        assert spiller._buffered < 6
+    spiller.flush_all()
+    assert sorted(len(s.load()) for s in spiller.spills.values()) == [10, 10]
+
+
+def test_parse_to_nc(tmp_path, ncinfo, db):
+    recs = make_records(300, start=datetime(2024, 1, 1, 23, 30)) + make_records(50, station='R7254')
+    shuffled = recs[:]
+    random.Random(0).shuffle(shuffled)
+    paths = _write_inputs(str(tmp_path / "in"), shuffled, 40)
+    out = str(tmp_path / "out")
+    results = parse_to_nc(ncinfo, FileProcessor(JsonParser, 1), paths, out, batch_size=32, db_client=db, coll_name='raw',
+                          num_workers=1, spill_dir=str(tmp_path), max_buffered=64)
+    assert [r.count for r in results] == [180, 120, 50] and all(r.ok for r in results)
+    assert db.db['raw'].count_documents({}) == 350
+    assert [p for p in os.listdir(tmp_path) if p.startswith("parse_to_nc_")] == []     # 溢写文件已删除
+    with nc.Dataset(results[0].nc_path) as ds:
+        times = list(ds['observation/Datetime'][:])
+    assert times == sorted(times) and times[-1] == '2024-01-01 23:59:50'
+    again = parse_to_nc(ncinfo, FileProcessor(JsonParser, 1), paths, out, num_workers=1)
+    assert again == []                                                                # 已存在的文件跳过
+
+
+def test_parse_to_nc_save_failure_after_summary(tmp_path, ncinfo, caplog):
+    paths = _write_inputs(str(tmp_path / "in"), make_records(30), 10)
+    with pytest.raises(IOError):
+        parse_to_nc(ncinfo, FileProcessor(JsonParser, 1), paths, str(tmp_path / "out"), db_client=FailingDb(),
+                    coll_name='raw', num_workers=1)
+    assert "1/1 nc files generated" in caplog.text
+    assert "failed to save records into raw" in caplog.text
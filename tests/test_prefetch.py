@@ -0,0 +1,23 @@
+import pytest
+
+from conftest import make_records
+from generate import NcGenerator
+from generate.prefetch import Prefetcher, prefetch_docs
+
+
+def test_prefetch_docs_limit_and_fields(db, ncinfo):
+    db.db['RRD_Lraw'].insert_many(make_records(20))
+    generator = NcGenerator(ncinfo)
+    docs = list(prefetch_docs(db, 'RRD_Lraw', generator, sortby='Datetime', batch_size=4, limit=6))
+    assert len(docs) == 6
+    assert [d['Datetime'] for d in docs] == sorted(d['Datetime'] for d in docs)
+    assert all(set(d) <= set(generator.source_keys) for d in docs)
+
+
+def test_prefetcher_reraises_read_errors():
+    def source():
+        yield {"a": 1}
+        raise RuntimeError("cursor failed")
+
+    with pytest.raises(RuntimeError, match="cursor failed"):
+        list(Prefetcher(source(), batch_size=1))
@@ -0,0 +1,63 @@
+import json
+import os
+import pickle
+
+import pytest
+
+from parse.station_data import StationRegistry, get_registry, get_station_info
+
+
+def _write(path, stations):
+    with open(path, "w", encoding='utf8') as fp:
+        json.dump(stations, fp)
+
+
+@pytest.fixture
+def json_file(tmp_path):
+    path = str(tmp_path / "stations.json")
+    _write(path, {"A": {"site_code": "A", "site_name": "a"}, "B": {"station_id": "B", "station_name": "b"}})
+    return path
+
+
+def test_registry_normalizes_and_defaults(json_file):
+    registry = StationRegistry(json_file)
+    assert registry.get("A") == {"station_id": "A", "station_name": "a"}
+    assert registry.get("C", return_default=True) == {"station_id": "0", "station_name": "0"}
+    with pytest.raises(ValueError):
+        registry.get("C")
+    info = registry.get("A")
+    info["station_id"] = "changed"                  # 返回的是副本
+    assert registry.get("A")["station_id"] == "A"
+    assert "B" in registry and len(registry) == 3
+
+
+def test_get_many_refreshes_once(json_file, monkeypatch):
+    registry = StationRegistry(json_file)
+    calls = []
+    stat = os.stat
+    monkeypatch.setattr(os, 'stat', lambda path, *args, **kwargs: calls.append(path) or stat(path, *args, **kwargs))
+    assert list(registry.get_many(["A", "B", "C"], return_default=True)) == ["A", "B", "C"]
+    assert calls == [json_file]
+
+
+def test_registry_reloads_modified_file(json_file):
+    registry = StationRegistry(json_file)
+    assert "D" not in registry
+    _write(json_file, {"D": {"site_code": "D"}})
+    st = os.stat(json_file)
+    os.utime(json_file, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert registry.get("D") == {"station_id": "D"}
+
+
+def test_registry_pickles_path_only(json_file):
+    registry = get_registry(json_file)
+    assert get_registry(json_file) is registry
+    registry.get("A")
+    clone = pickle.loads(pickle.dumps(registry))
+    assert clone._stations == {} and clone.get("B")["station_name"] == "b"
+
+
+def test_phase_array_radar_stations():
+    info = get_station_info("PAR", "ZWN01")
+    assert info["station_id"] == "ZWN01" and info["station_name"] == "Xueshan"
+    assert get_station_info("PAR", "unknown", return_default=True)["station_id"] == "0"
@@ -0,0 +1,114 @@
+import time
+
+import netCDF4 as nc
+import numpy as np
+import pytest
+
+from conftest import make_records
+from generate import NcGenerator
+from generate.config.BaseType import NcType
+from generate.plan import compile_plan
+
+
+def test_same_variable_name_in_two_groups(tmp_path, ncinfo):
+    ncinfo["observation"] = {
+        "obs_a": [('HGT', NcType.ushort, (('Datetime', None), ('Dime_HGT', 4)), 'Height A', 'm'),
+                  ('Datetime', NcType.string, (('Datetime', None), ), 'Datetime', '-')],
+        "obs_b": [('Spectrum', ('HGT', NcType.double, (('Datetime', None), ('Dime_HGT', 4), ('Dime_diam', 3)), 'Height B', 'm'))],
+    }
+    recs = make_records(5)
+    path = str(tmp_path / "groups.nc")
+    assert NcGenerator(ncinfo).gerneral_nc_stream(path, recs, batch_size=2) == 5
+    with nc.Dataset(path) as ds:
+        np.testing.assert_array_equal(ds['observation/obs_a/HGT'][:], [r['HGT'] for r in recs])
+        np.testing.assert_allclose(ds['observation/obs_b/HGT'][:], [r['Spectrum'] for r in recs])
+        assert ds['head/head_grp3/Obse_end_DT'][...] == recs[-1]['Datetime']
+
+
+def test_same_head_name_in_two_groups(tmp_path, ncinfo):
+    ncinfo["head"]["head_grp2"] = [('-', ('Country', NcType.string, (), 'Country', '-', 'France'))]
+    path = str(tmp_path / "head.nc")
+    assert NcGenerator(ncinfo).gerneral_nc_stream(path, make_records(3)) == 3
+    with nc.Dataset(path) as ds:
+        assert ds['head/head_grp1/Country'][...] == 'China'
+        assert ds['head/head_grp2/Country'][...] == 'France'
+
+
+def test_plan_cache_is_bounded(ncinfo, monkeypatch):
+    import generate.plan as plan_module
+    monkeypatch.setattr(plan_module, 'PLAN_CACHE_SIZE', 2)
+    plan_module._PLAN_CACHE.clear()
+    plans = []
+    for value in ('a', 'b', 'c'):
+        ncinfo["head"]["head_grp1"][1] = ('-', ('Country', NcType.string, (), 'Country', '-', value))
+        plans.append(compile_plan(ncinfo))
+    assert len(plan_module._PLAN_CACHE) == 2
+    assert plans[0].fingerprint not in plan_module._PLAN_CACHE
+    assert compile_plan(ncinfo) is plans[-1]
+
+
+def _datetimes(path):
+    with nc.Dataset(path) as ds:
+        return list(ds['observation/Datetime'][:]), ds['head/head_grp3/Obse_end_DT'][...]
+
+
+def test_append_to_end_and_create(tmp_path, ncinfo):
+    generator = NcGenerator(ncinfo)
+    recs = make_records(12)
+    path = str(tmp_path / "append.nc")
+    assert generator.append_nc_stream(path, recs[:5], batch_size=2) == 5      # 文件不存在时新建
+    assert generator.append_nc_stream(path, iter(recs[5:]), batch_size=4) == 7
+    assert generator.append_nc_stream(path, []) == 0
+    times, end = _datetimes(path)
+    assert times == [r['Datetime'] for r in recs] and end == recs[-1]['Datetime']
+
+
+def test_append_from_offset_overwrites_tail(tmp_path, ncinfo, caplog):
+    generator = NcGenerator(ncinfo)
+    recs = make_records(10)
+    path = str(tmp_path / "offset.nc")
+    generator.gerneral_nc_stream(path, recs[:8])
+    assert generator.append_nc_stream(path, recs[6:], offset=6) == 4             # 覆盖中断时写入的第6、7条
+    times, _ = _datetimes(path)
+    assert times == [r['Datetime'] for r in recs]
+    assert "stale" not in caplog.text
+    generator.append_nc_stream(path, recs[2:4], offset=2)                        # 覆盖的数据少于原有尾部
+    times, _ = _datetimes(path)
+    assert len(times) == 10 and times[4:] == [r['Datetime'] for r in recs[4:]]
+    assert "6 stale records remain" in caplog.text
+
+
+def test_append_offset_beyond_length(tmp_path, ncinfo):
+    generator = NcGenerator(ncinfo)
+    path = str(tmp_path / "gap.nc")
+    generator.gerneral_nc_stream(path, make_records(3))
+    with pytest.raises(ValueError, match="beyond"):
+        generator.append_nc_stream(path, make_records(2), offset=5)
+    assert len(_datetimes(path)[0]) == 3
+
+
+def test_stage_metrics(tmp_path, ncinfo):
+    from log.metrics import METRICS
+    generator = NcGenerator(ncinfo)
+    METRICS.reset()
+    st = time.perf_counter()
+    generator.gerneral_nc_stream(str(tmp_path / "m.nc"), make_records(40), batch_size=4)
+    elapsed = time.perf_counter() - st
+    timers = {stat["name"]: stat for stat in METRICS.snapshot()["timers"] if not stat["labels"]}
+    assert timers["column_assembly"]["count"] == 10
+    assert timers["column_assembly"]["total"] + timers["close"]["total"] <= elapsed
+    counters = {stat["name"]: stat["value"] for stat in METRICS.snapshot()["counters"]}
+    assert counters["records_written"] == 40
+
+
+def test_memory_matches_file(tmp_path, ncinfo):
+    generator = NcGenerator(ncinfo)
+    recs = make_records(30)
+    path = str(tmp_path / "file.nc")
+    assert generator.gerneral_nc(path, recs) == 30
+    buf, count = generator.gerneral_nc_memory(iter(recs), batch_size=7, initial_size=1024)
+    assert count == 30
+    with nc.Dataset(path) as a, nc.Dataset("memory.nc", memory=bytes(buf)) as b:
+        for name in ('Datetime', 'HGT', 'Spectrum'):
+            np.testing.assert_array_equal(a['observation'][name][:], b['observation'][name][:])
+        assert b['head/head_grp3/Obse_end_DT'][...] == recs[-1]['Datetime']